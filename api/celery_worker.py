@@ -1,8 +1,8 @@
 from celery import Celery
 from celery.result import AsyncResult
-from shared.env import REDIS_HOST, REDIS_PASSWORD, REDIS_PORT
+from shared.env import REDIS_URL
 
-redis_url = f"redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0"
+redis_url = REDIS_URL
 app = Celery(
     "tasks",
     broker=redis_url,
@@ -0,0 +1,43 @@
+from shared.env import (
+    TORRENT_RESUME_DIR,
+    TORRENT_METADATA_DIR,
+    TORRENT_STATE_FILE,
+    TORRENT_STORE_DIR,
+    TORRENT_PROFILE,
+    TORRENT_ACTIVE_DOWNLOADS,
+    TORRENT_ACTIVE_SEEDS,
+    TORRENT_ACTIVE_LIMIT,
+    TORRENT_DOWNLOAD_LIMIT,
+    TORRENT_UPLOAD_LIMIT,
+    TORRENT_USER_DOWNLOAD_LIMIT,
+    TORRENT_USER_UPLOAD_LIMIT,
+    TORRENT_MAX_RATIO,
+    TORRENT_MAX_SEED_MINUTES,
+    TORRENT_SEED_WHILE_IDLE,
+)
+from shared.factory import redis
+from shared.modules.libtorrentx import LibTorrentSession, EngineDaemon
+
+# python engine_worker.py
+# Owns the process-wide libtorrent session, so connections, DHT and disk I/O
+# are shared by every torrent of every user and survive API restarts
+
+if __name__ == "__main__":
+    lt_session = LibTorrentSession(
+        resume_dir=TORRENT_RESUME_DIR,
+        metadata_dir=TORRENT_METADATA_DIR,
+        state_file=TORRENT_STATE_FILE,
+        store_dir=TORRENT_STORE_DIR,
+        profile=TORRENT_PROFILE,
+        active_downloads=TORRENT_ACTIVE_DOWNLOADS,
+        active_seeds=TORRENT_ACTIVE_SEEDS,
+        active_limit=TORRENT_ACTIVE_LIMIT,
+        download_limit=TORRENT_DOWNLOAD_LIMIT,
+        upload_limit=TORRENT_UPLOAD_LIMIT,
+        user_download_limit=TORRENT_USER_DOWNLOAD_LIMIT,
+        user_upload_limit=TORRENT_USER_UPLOAD_LIMIT,
+        max_ratio=TORRENT_MAX_RATIO,
+        max_seed_time=TORRENT_MAX_SEED_MINUTES * 60,
+        seed_while_idle=TORRENT_SEED_WHILE_IDLE,
+    )
+    EngineDaemon(lt_session, redis).run()
@@ -15,11 +15,16 @@ fi
 # Start Celery Worker
 celery -A celery_worker worker -Q transcoding --concurrency=$CELERY_NUM_WORKERS --loglevel=info -E &
 
+# Start Torrent Engine
+python engine_worker.py &
+
 # Start API Server
 if [ "$API_DEBUG" = "True" ]; then
     echo "Running Development Server"
     uvicorn main:app --reload --host 0.0.0.0 --port 8080
 else
     echo "Running Production Server"
-    uvicorn main:app --host 0.0.0.0 --port 8080
+    # Socket.IO state is shared through redis and the UI connects with the
+    # websocket transport only, so any number of workers can serve it
+    uvicorn main:app --host 0.0.0.0 --port 8080 --workers ${API_NUM_WORKERS:-1}
 fi
\ No newline at end of file
@@ -2,7 +2,23 @@ from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from router import ping, torrent, auth, files
-from shared.sockets import sio_app
+from shared.sockets import sio_app, emit, presence
+from shared.snapshots import snapshots
+from shared.engine import engine
+from shared.bridge import bridge
+from router.torrent.common import (
+    handle_engine_status,
+    handle_engine_snapshot,
+    forget_engine_status,
+    forget_engine_snapshot,
+    pause_orphaned_torrents,
+    flush_torrent_writes,
+    torrent_writes,
+    torrent_changes,
+)
+from shared.factory import db, async_redis
+from functools import partial
+import asyncio
 import celery_worker
 
 API_ROOT = "/api"
@@ -14,6 +30,34 @@ app = FastAPI(
     openapi_url=f"{API_ROOT}/openapi.json",
 )
 
+
+@app.on_event("startup")
+async def startup():
+    bridge.start()
+    engine.start_status_consumer(
+        handle_engine_status,
+        on_forget=forget_engine_status,
+        on_lead=torrent_writes.reset,
+    )
+    engine.start_status_listener(handle_engine_snapshot, forget_engine_snapshot)
+    asyncio.create_task(flush_torrent_writes())
+    asyncio.create_task(presence.run())
+    asyncio.create_task(
+        snapshots.run(partial(emit, local=True), presence.local, async_redis)
+    )
+    await pause_orphaned_torrents()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await torrent_writes.flush_async(
+        db.torrents,
+        stamp=torrent_changes.stamp_async,
+        unstamp=torrent_changes.unstamp_async,
+    )
+    await async_redis.close()
+
+
 app.mount(f"/socket.io", app=sio_app)
 
 # Add CORS middleware
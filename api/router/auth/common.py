@@ -1,5 +1,6 @@
 from fastapi import HTTPException
-from shared.factory import redis
+from shared.factory import db, redis
+from bson import ObjectId
 from pydantic import BaseModel
 
 
@@ -26,3 +27,15 @@ def authenticate_user(session_token):
         raise login_error
 
     return user_id
+
+
+async def authenticate_admin(session_token):
+    user_id = authenticate_user(session_token)
+
+    user = await db.users.find_one(
+        {"_id": ObjectId(user_id.decode("utf-8"))}, {"role": True}
+    )
+    if not user or user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return user_id
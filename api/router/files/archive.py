@@ -5,7 +5,7 @@ from pydantic import BaseModel
 import os
 import shutil
 from zipfile import ZipFile
-from .status import get_disk_usage
+from shared.utils import get_disk_usage
 from shared.sockets import emit
 
 
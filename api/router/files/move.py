@@ -3,7 +3,7 @@ from ..auth.common import authenticate_user
 from pathlib import Path
 import shutil
 import os
-from .status import get_disk_usage
+from shared.utils import get_disk_usage
 from shared.sockets import emit
 
 router = APIRouter()
@@ -78,4 +78,4 @@ async def public_file_access(request: Request, key: str, download: str = "false"
         raise HTTPException(status_code=404, detail="File not found")
 
     download = download == "true" or download == "1"
-    return handle_stream_file(request, path, download)
+    return await handle_stream_file(request, path, download)
@@ -2,6 +2,9 @@ from fastapi import APIRouter, HTTPException, Request
 from ..auth.common import authenticate_user
 from starlette.responses import StreamingResponse, FileResponse
 from pathlib import Path
+from bson import ObjectId
+from shared.engine import request_command
+from shared.factory import db
 import os
 import mimetypes
 import re
@@ -33,16 +36,138 @@ async def async_file_iterator(path, start=0, length=None, chunk_size=4 * 1024 *
             await asyncio.sleep(0)
 
 
-def handle_stream_file(request, path, download=False):
+async def async_torrent_file_iterator(
+    info_hash, file_index, path, start=0, length=None, chunk_size=1024 * 1024
+):
+    """Stream a file of a torrent which is still downloading, the engine is
+    only asked again when the stream reaches a piece which was missing"""
+    f = None
+    remaining = length
+    available = 0
+    try:
+        while remaining > 0:
+            read_size = min(chunk_size, remaining)
+            if available <= 0:
+                available = await request_command(
+                    "wait_for_range",
+                    timeout=70,
+                    info_hash=info_hash,
+                    file_index=file_index,
+                    start=start,
+                    length=read_size,
+                )
+            if not available:
+                # Content-Length was promised, end the response with an error
+                # so the connection is reset instead of a truncated body
+                raise TimeoutError(f"Range {start}-{start + read_size} not available")
+
+            if f is None:
+                f = open(path, "rb")
+            f.seek(start)
+            data = f.read(min(read_size, available))
+            if not data:
+                raise EOFError(f"Range {start}-{start + read_size} not on disk")
+
+            start += len(data)
+            remaining -= len(data)
+            available -= len(data)
+            yield data
+    finally:
+        if f is not None:
+            f.close()
+
+
+async def get_torrent_file(path, abs_path):
+    """Get file of a torrent the engine is still downloading
+
+    The engine is only asked for torrents which are not finished or whose
+    file is missing on disk, anything else is served straight from disk.
+
+    Args:
+        path (str): path relative to the downloads directory,
+            {user_id}/{info_hash}/{file path in torrent}
+        abs_path (Path): resolved path of the file on disk
+
+    Returns:
+        dict: file_index, file_size and path on disk, None if not downloading
+            or the engine is not responding
+    """
+    parts = Path(path).parts
+    if len(parts) < 3 or not ObjectId.is_valid(parts[0]):
+        return None
+
+    torrent = await db.torrents.find_one(
+        {"info_hash": parts[1], "user_id": ObjectId(parts[0])},
+        {"is_finished": True},
+    )
+    if not torrent:
+        return None
+    if torrent.get("is_finished") and abs_path.is_file():
+        return None
+
+    try:
+        return await request_command(
+            "stream_file", info_hash=parts[1], path="/".join(parts[2:])
+        )
+    except HTTPException:
+        # Engine down or busy, serve whatever is on disk
+        return None
+
+
+def handle_torrent_stream(request, info_hash, torrent_file, mimetype):
+    file_size = torrent_file["file_size"]
+    range_header = request.headers.get("Range")
+
+    start, end = 0, file_size - 1
+    if range_header:
+        match = re.match(r"bytes=(\d+)-(\d*)", range_header)
+        if not match:
+            raise HTTPException(status_code=416, detail="Invalid range")
+
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else file_size - 1
+
+        if start >= file_size:
+            raise HTTPException(status_code=416, detail="Range not satisfiable")
+
+        end = min(end, file_size - 1)
+
+    length = end - start + 1
+    headers = {"Content-Length": str(length), "Accept-Ranges": "bytes"}
+    if range_header:
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+
+    return StreamingResponse(
+        async_torrent_file_iterator(
+            info_hash, torrent_file["file_index"], torrent_file["path"], start, length
+        ),
+        status_code=206 if range_header else 200,
+        media_type=mimetype,
+        headers=headers,
+    )
+
+
+async def handle_stream_file(request, path, download=False):
     base_path = Path(os.getenv("DOWNLOAD_PATH", "/downloads")).resolve()
     abs_path = (base_path / path).resolve()
 
+    if not str(abs_path).startswith(str(base_path)):
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    # Files of torrents still downloading are served as their pieces arrive
+    torrent_file = None if download else await get_torrent_file(path, abs_path)
+    if torrent_file:
+        mimetype = mimetypes.guess_type(abs_path)[0] or "application/octet-stream"
+        if mimetype.startswith("video"):
+            mimetype = "video/mp4"
+        return handle_torrent_stream(
+            request, Path(path).parts[1], torrent_file, mimetype
+        )
+
     if not abs_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
     if not abs_path.is_file():
         raise HTTPException(status_code=400, detail="Not a file")
-    if not str(abs_path).startswith(str(base_path)):
-        raise HTTPException(status_code=403, detail="Access denied")
 
     if download:
         return FileResponse(abs_path, filename=abs_path.name)
@@ -95,4 +220,4 @@ def handle_stream_file(request, path, download=False):
 @router.get("/stream")
 async def stream_file(request: Request, path: str = "", download: bool = False):
     user_id = authenticate_user(request.cookies.get("session_token"))
-    return handle_stream_file(request, path, download)
+    return await handle_stream_file(request, path, download)
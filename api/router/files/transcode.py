@@ -8,7 +8,7 @@ from tasks.transcode_video import transcode_video
 import json
 import time
 import asyncio
-from .status import get_disk_usage
+from shared.utils import get_disk_usage
 
 router = APIRouter()
 
@@ -83,8 +83,8 @@ async def transcode(path: str, request: Request, stream: bool = False):
                 while True:
                     progress_data = redis.get(key)
                     if progress_data:
+                        # Progress is emitted by the transcoding task itself
                         emit(f"/stc/disk-usage", get_disk_usage(user_id), user_id)
-                        emit(f"/stc/{key}", json.loads(progress_data), user_id)
                         yield ""
                     else:
                         yield "1"
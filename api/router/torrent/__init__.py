@@ -7,6 +7,10 @@ from .all import router as all_router
 from .delete import router as delete_router
 from .search import router as search_router
 from .download_status import router as download_status_router
+from .files import router as files_router
+from .queue import router as queue_router
+from .bandwidth import router as bandwidth_router
+from .changes import router as changes_router
 
 
 router = APIRouter(
@@ -21,4 +25,8 @@ router.include_router(get_router)
 router.include_router(all_router)
 router.include_router(delete_router)
 router.include_router(search_router)
-router.include_router(download_status_router)
\ No newline at end of file
+router.include_router(download_status_router)
+router.include_router(files_router)
+router.include_router(queue_router)
+router.include_router(bandwidth_router)
+router.include_router(changes_router)
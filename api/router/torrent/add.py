@@ -1,23 +1,30 @@
 import hashlib
-from fastapi import APIRouter, Request, Response, HTTPException, UploadFile, File
+from typing import Optional
+from fastapi import (
+    APIRouter,
+    Request,
+    Response,
+    HTTPException,
+    UploadFile,
+    File,
+    Form,
+)
 from pydantic import BaseModel
 from shared.factory import db, redis
 from shared.sockets import emit
 from ..auth.common import authenticate_user
 from .common import (
-    MagnetDto,
+    AddTorrentDto,
     UrlDto,
     magnet_utils,
-    pause_unfinished_torrents,
-    update_to_db,
-    copy_if_already_exists,
+    start_torrent,
+    torrent_changes,
 )
+from shared.engine import engine
 from .download_status import get_download_status
-from shared.modules.libtorrentx import LibTorrentSession
 from bson import ObjectId
 import asyncio
 import datetime
-import tempfile
 import os
 import subprocess as sp
 import traceback
@@ -26,119 +33,155 @@ from tasks.download_from_url import download_from_url
 
 router = APIRouter()
 
-# On app reload, update status of any downloading torrent status to paused,
-# as they may be killed already due to app reload
-asyncio.create_task(pause_unfinished_torrents())
+MAX_TORRENT_FILE_SIZE = 10 * 1024 * 1024
 
 
 @router.post("/add")
-async def add_torrent(dto: MagnetDto, request: Request):
+async def add_torrent(dto: AddTorrentDto, request: Request):
     user_id = authenticate_user(request.cookies.get("session_token")).decode("utf-8")
 
     # extract info_hash from magnet
     info_hash = magnet_utils._clean_magnet_uri(dto.magnet).split(":")[3][:40]
 
-    lt_session = LibTorrentSession(redis=redis)
-
     # add torrent to db
     already_exists = await db.torrents.find_one(
         {"info_hash": info_hash, "user_id": ObjectId(user_id)},
-        {"_id": True, "is_paused": True, "is_finished": True},
+        {
+            "_id": True,
+            "is_paused": True,
+            "is_finished": True,
+            "file_priorities": True,
+        },
     )
 
+    version = torrent_changes.record(user_id, info_hash)
     if already_exists:
         await db.torrents.update_one(
             {"_id": already_exists.get("_id")},
-            {"$set": {"is_paused": False, "is_finished": False}},
+            {
+                "$set": {
+                    "is_paused": False,
+                    "is_finished": False,
+                    "preview": dto.preview,
+                    "sequential_file": dto.sequential_file,
+                    "version": version,
+                }
+            },
         )
+        torrent_changes.release(user_id, version)
     else:
+        engine.forget(user_id, info_hash)
         await db.torrents.insert_one(
             {
                 "info_hash": info_hash,
                 "user_id": ObjectId(user_id),
                 "magnet": dto.magnet,
+                "preview": dto.preview,
+                "sequential_file": dto.sequential_file,
                 "created_at": datetime.datetime.now(),
+                "version": version,
             }
         )
+        torrent_changes.release(user_id, version)
         emit(
             f"/stc/torrent-added-or-removed",
             {"action": "added", "info_hash": info_hash},
             user_id,
         )
 
-    redis.delete(f"{user_id}/{info_hash}/stop")
-    redis.delete(f"{user_id}/{info_hash}/copied_from_existing")
-
-    handle = lt_session.add_torrent(dto.magnet, f"/downloads/{user_id}")
-    handle.set_callback(
-        lambda props: update_to_db(props, ObjectId(user_id)),
-        callback_interval=1,
-        user_id=user_id,
+    start_torrent(
+        dto.magnet,
+        user_id,
+        (already_exists or {}).get("file_priorities"),
+        preview=dto.preview,
+        sequential_file=dto.sequential_file,
     )
 
     return {"message": "Magnet Exists" if already_exists else "Magnet Added"}
 
 
 @router.post("/add-file")
-async def add_torrent_file(request: Request, torrent: UploadFile = File(...)):
+async def add_torrent_file(
+    request: Request,
+    torrent: UploadFile = File(...),
+    preview: bool = Form(False),
+    sequential_file: Optional[int] = Form(None),
+):
     user_id = authenticate_user(request.cookies.get("session_token")).decode("utf-8")
 
-    # Save the uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".torrent") as temp_file:
-        content = await torrent.read()
-        temp_file.write(content)
-        temp_file_path = temp_file.name
+    # Read the upload in chunks, .torrent files are small so reject anything large
+    content = bytearray()
+    while chunk := await torrent.read(64 * 1024):
+        content.extend(chunk)
+        if len(content) > MAX_TORRENT_FILE_SIZE:
+            raise HTTPException(status_code=413, detail="Torrent file too large")
 
+    # Keep the metadata, trackers and web seeds of the torrent file
     try:
-        lt_session = LibTorrentSession(redis=redis)
-        # Convert .torrent file to magnet link
-        magnet = lt_session._get_magnet_from_torrent_file(temp_file_path)
+        torrent_info = magnet_utils._get_torrent_info(bytes(content))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid torrent file")
 
-        # extract info_hash from magnet
-        info_hash = magnet_utils._clean_magnet_uri(magnet).split(":")[3][:40]
+    magnet = magnet_utils._get_magnet_from_torrent_info(torrent_info)
+    info_hash = str(torrent_info.info_hash()).lower()
 
-        # Check if torrent already exists
-        already_exists = await db.torrents.find_one(
-            {"info_hash": info_hash, "user_id": ObjectId(user_id)},
-            {"_id": True, "is_paused": True, "is_finished": True},
-        )
+    # Check if torrent already exists
+    already_exists = await db.torrents.find_one(
+        {"info_hash": info_hash, "user_id": ObjectId(user_id)},
+        {
+            "_id": True,
+            "is_paused": True,
+            "is_finished": True,
+            "file_priorities": True,
+        },
+    )
 
-        if already_exists:
-            await db.torrents.update_one(
-                {"_id": already_exists.get("_id")},
-                {"$set": {"is_paused": False, "is_finished": False}},
-            )
-        else:
-            await db.torrents.insert_one(
-                {
-                    "info_hash": info_hash,
-                    "user_id": ObjectId(user_id),
-                    "magnet": magnet,
-                    "created_at": datetime.datetime.now(),
+    version = torrent_changes.record(user_id, info_hash)
+    if already_exists:
+        await db.torrents.update_one(
+            {"_id": already_exists.get("_id")},
+            {
+                "$set": {
+                    "is_paused": False,
+                    "is_finished": False,
+                    "preview": preview,
+                    "sequential_file": sequential_file,
+                    "version": version,
                 }
-            )
-            emit(
-                f"/stc/torrent-added-or-removed",
-                {"action": "added", "info_hash": info_hash},
-                user_id,
-            )
-            emit(f"/stc/download_status", await get_download_status(user_id), user_id)
-
-        redis.delete(f"{user_id}/{info_hash}/stop")
-        redis.delete(f"{user_id}/{info_hash}/copied_from_existing")
-
-        handle = lt_session.add_torrent(magnet, f"/downloads/{user_id}")
-        handle.set_callback(
-            lambda props: update_to_db(props, ObjectId(user_id)),
-            callback_interval=1,
-            user_id=user_id,
+            },
         )
+        torrent_changes.release(user_id, version)
+    else:
+        engine.forget(user_id, info_hash)
+        await db.torrents.insert_one(
+            {
+                "info_hash": info_hash,
+                "user_id": ObjectId(user_id),
+                "magnet": magnet,
+                "preview": preview,
+                "sequential_file": sequential_file,
+                "created_at": datetime.datetime.now(),
+                "version": version,
+            }
+        )
+        torrent_changes.release(user_id, version)
+        emit(
+            f"/stc/torrent-added-or-removed",
+            {"action": "added", "info_hash": info_hash},
+            user_id,
+        )
+        emit(f"/stc/download_status", await get_download_status(user_id), user_id)
+
+    start_torrent(
+        magnet,
+        user_id,
+        (already_exists or {}).get("file_priorities"),
+        torrent=bytes(content),
+        preview=preview,
+        sequential_file=sequential_file,
+    )
 
-        return {"message": "Magnet Exists" if already_exists else "Magnet Added"}
-
-    finally:
-        # Clean up the temporary file
-        os.unlink(temp_file_path)
+    return {"message": "Magnet Exists" if already_exists else "Magnet Added"}
 
 
 def get_filename_from_url(url):
@@ -217,7 +260,9 @@ async def direct_download(dto: UrlDto, request: Request):
         if already_exists:
             return {"message": "URL Exists"}
 
+        obj["version"] = torrent_changes.record(user_id, url_hash)
         await db.torrents.insert_one(obj)
+        torrent_changes.release(user_id, obj["version"])
 
         result = download_from_url.delay(dto.url, url_hash, save_dir, str(user_id))
 
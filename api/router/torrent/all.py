@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Query, Request
 from bson import ObjectId
+import datetime
 
 from shared.factory import db
 from shared.sockets import emit
 from ..auth.common import authenticate_user
-from ..files.status import get_disk_usage
+from shared.utils import get_disk_usage
 from .download_status import get_download_status
+from .common import torrent_changes
 from pathlib import Path
 
 router = APIRouter()
@@ -22,6 +24,13 @@ async def all_torrent(
         user_id = str(user_id.decode())
 
     user_oid = ObjectId(user_id)
+
+    # Clients sync changes after this version on reconnect. Everything up to
+    # it has landed before the page is read, changes racing with the page
+    # are fetched again.
+    loaded_at = datetime.datetime.now()
+    version = torrent_changes.synced(user_id)
+
     filter_query = {"user_id": user_oid}
     total_torrents = await db.torrents.count_documents(filter_query)
     skip = (page - 1) * page_size
@@ -51,5 +60,11 @@ async def all_torrent(
 
     return {
         "data": torrents,
-        "meta": {"page": page, "page_size": page_size, "total": total_torrents},
+        "meta": {
+            "page": page,
+            "page_size": page_size,
+            "total": total_torrents,
+            "version": version,
+            "loaded_at": loaded_at,
+        },
     }
@@ -0,0 +1,55 @@
+from typing import Optional
+from fastapi import APIRouter, Request, HTTPException
+from pydantic import BaseModel
+from shared.factory import db
+from shared.engine import request_command, send_command
+from ..auth.common import authenticate_admin
+from bson import ObjectId
+from bson.errors import InvalidId
+
+router = APIRouter()
+
+
+class BandwidthDto(BaseModel):
+    scope: str  # global, default (every user without own limits) or user
+    user_id: Optional[str] = None
+    download_limit: Optional[int] = None  # bytes/s, 0 for unlimited
+    upload_limit: Optional[int] = None
+
+
+@router.get("/bandwidth")
+async def bandwidth_limits(request: Request):
+    await authenticate_admin(request.cookies.get("session_token"))
+
+    return {"data": await request_command("get_bandwidth")}
+
+
+@router.post("/bandwidth")
+async def set_bandwidth_limits(dto: BandwidthDto, request: Request):
+    await authenticate_admin(request.cookies.get("session_token"))
+
+    if dto.scope not in ("global", "default", "user"):
+        raise HTTPException(status_code=400, detail="Invalid scope")
+    limits = (dto.download_limit, dto.upload_limit)
+    if any(limit is not None and limit < 0 for limit in limits):
+        raise HTTPException(status_code=400, detail="Limits must be 0 or more")
+
+    if dto.scope == "user":
+        try:
+            user = await db.users.find_one(
+                {"_id": ObjectId(dto.user_id)}, {"_id": True}
+            )
+        except (InvalidId, TypeError):
+            user = None
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+    send_command(
+        "bandwidth",
+        scope=dto.scope,
+        user_id=dto.user_id,
+        download_limit=dto.download_limit,
+        upload_limit=dto.upload_limit,
+    )
+
+    return {"message": "success"}
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Query, Request
+from fastapi.encoders import jsonable_encoder
+from shared.sockets import sio
+from ..auth.common import authenticate_user
+from .common import get_changes
+
+router = APIRouter()
+
+
+@router.get("/changes")
+async def torrent_changes_since(request: Request, since: int = Query(0, ge=0)):
+    user_id = authenticate_user(request.cookies.get("session_token")).decode("utf-8")
+
+    return await get_changes(user_id, since)
+
+
+@sio.on("/cts/torrent-changes")
+async def replay_torrent_changes(sid, data):
+    # Replayed to a reconnecting client through the event's acknowledgement
+    session = await sio.get_session(sid)
+    user_id = session.get("user_id")
+    if not user_id:
+        return None
+
+    try:
+        since = max(int((data or {}).get("since", 0)), 0)
+    except (TypeError, ValueError):
+        since = 0
+
+    return jsonable_encoder(await get_changes(user_id, since))
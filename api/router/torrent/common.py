@@ -1,86 +1,193 @@
+from typing import Optional
 from pydantic import BaseModel
 from shared.modules.libtorrentx import MagnetUtils
-from shared.factory import db, redis
-from shared.sockets import emit
-from ..files.status import get_disk_usage
+from shared.factory import db, redis, async_redis
+from shared.snapshots import snapshots
+from shared.engine import engine, send_command
+from shared.writebehind import WriteBehind
+from shared.changes import ChangeLog
+from bson import ObjectId
 from .download_status import get_download_status
 import shutil
 import os
-import glob
 import asyncio
+import base64
 
 
 class MagnetDto(BaseModel):
     magnet: str
 
 
+class AddTorrentDto(MagnetDto):
+    preview: bool = False  # first and last pieces of video files first
+    sequential_file: Optional[int] = None  # index of a file to download in order
+
+
 class UrlDto(BaseModel):
     url: str
 
 
 magnet_utils = MagnetUtils()
 
+# Progress of torrents is written to db as diffs, in bulk every few seconds
+torrent_writes = WriteBehind()
+
+# Versions of changes of torrents per user, for clients syncing after reconnects
+torrent_changes = ChangeLog(redis, async_redis)
 
-def get_directory_size(directory):
-    return sum(f.stat().st_size for f in os.scandir(directory) if f.is_file())
+
+def user_props(props, user_id):
+    # The engine reports the content store, files are linked into the user's
+    # own directory
+    props = dict(props)
+    props["save_dir"] = os.path.realpath(
+        f"/downloads/{user_id}/{props.get('info_hash')}"
+    )
+    return props
 
 
-def copy_if_already_exists(info_hash, user_id):
-    if redis.get(f"{user_id}/{info_hash}/copied_from_existing"):
+def update_to_db(props, user_id):
+    if not user_id:
         return
 
-    existing_directories = glob.glob(f"/downloads/*/{info_hash}")
-    current_user_directory = os.path.join(f"/downloads/{user_id}/{info_hash}")
+    props = user_props(props, user_id)
+    torrent_writes.update(
+        {"info_hash": props["info_hash"], "user_id": user_id}, props
+    )
+
 
-    if len(existing_directories):
+async def flush_torrent_writes(interval=0.5):
+    """Write buffered torrent progress to db, runs on the app's event loop"""
+    while True:
         try:
-            other_user_directories = [
-                directory
-                for directory in existing_directories
-                if str(user_id) not in directory
-            ]
-            if other_user_directories:
-                # Find the directory with the largest size
-                largest_directory = max(other_user_directories, key=get_directory_size)
-                # shutil.copytree(largest_directory, current_user_directory, dirs_exist_ok=True)
-                os.system(f"rsync -a {largest_directory}/ {current_user_directory}/")
-                redis.set(f"{user_id}/{info_hash}/copied_from_existing", 1)
-                redis.expire(f"{user_id}/{info_hash}/copied_from_existing", 60 * 60)
+            if torrent_writes.due():
+                await torrent_writes.flush_async(
+                    db.torrents,
+                    stamp=torrent_changes.stamp_async,
+                    unstamp=torrent_changes.unstamp_async,
+                )
         except Exception as error:
             print(error)
+        await asyncio.sleep(interval)
+
+
+def start_torrent(
+    magnet,
+    user_id,
+    file_priorities=None,
+    torrent=None,
+    preview=False,
+    sequential_file=None,
+):
+    """Add a torrent to the engine daemon, its progress is persisted for
+    user_id by handle_engine_status
+
+    Args:
+        magnet (str): magnet link
+        user_id (str): user id
+        file_priorities (list, optional): priority per file selected by the user
+        torrent (bytes, optional): content of a torrent file, used instead of
+            fetching metadata for the magnet link
+        preview (bool, optional): download first and last pieces of video
+            files first
+        sequential_file (int, optional): index of a file to download in order
+    """
+    send_command(
+        "add",
+        user_id=str(user_id),
+        save_dir=f"/downloads/{user_id}",
+        magnet=magnet,
+        torrent=base64.b64encode(torrent).decode() if torrent else None,
+        file_priorities=file_priorities,
+        preview=preview,
+        sequential_file=sequential_file,
+    )
 
 
-def update_to_db(props, user_id):
-    if not user_id:
-        return
+def handle_engine_status(user_id, props):
+    # Consumed by a single worker, so what was persisted is known
+    update_to_db(props, ObjectId(user_id))
 
-    props = props.asdict()
-    copy_if_already_exists(props.get("info_hash"), user_id)
 
-    if props.get("is_finished") or props.get("is_paused"):
-        redis.delete(f"{user_id}/{props['info_hash']}/copied_from_existing")
+def handle_engine_snapshot(user_id, props):
+    # Every worker sends torrent progress to its own clients, batched per user
+    props = user_props(props, user_id)
+    snapshots.update(user_id, props["info_hash"], props)
 
-    # Update torrent progress via socket.io
-    emit(f"/stc/torrent-props-update/{props.get('info_hash')}", props, user_id)
-    emit(f"/stc/disk-usage", get_disk_usage(str(user_id)), user_id)
-    # emit(f"/stc/download_status", await get_download_status(user_id), user_id)
-    db.torrents.update_one(
-        {"info_hash": props["info_hash"], "user_id": user_id}, {"$set": props}
-    )
+
+def forget_engine_status(user_id, info_hash):
+    torrent_writes.forget({"info_hash": info_hash, "user_id": ObjectId(user_id)})
 
 
-async def pause_unfinished_torrents():
+def forget_engine_snapshot(user_id, info_hash):
+    snapshots.forget(user_id, info_hash)
+
+
+async def pause_orphaned_torrents():
+    """Mark downloading torrents the engine daemon does not know about as
+    paused, e.g. after its state was lost"""
+    subscriptions = engine.subscriptions()
+
     async for torrent in db.torrents.find(
         {
-            "$or": [{"is_finished": False}, {"is_finished": {"$exists": False}}],
-            "$or": [{"is_paused": False}, {"is_paused": {"$exists": False}}],
+            "$and": [
+                {"$or": [{"is_finished": False}, {"is_finished": {"$exists": False}}]},
+                {"$or": [{"is_paused": False}, {"is_paused": {"$exists": False}}]},
+                {"is_direct_download": {"$ne": True}},
+            ]
         },
-        {"_id": True, "is_direct_download": True},
+        {"_id": True, "info_hash": True, "user_id": True},
     ):
-        if torrent.get("is_direct_download"):
+        if f"{torrent.get('user_id')}/{torrent.get('info_hash')}" in subscriptions:
             continue
 
+        version = torrent_changes.record(
+            torrent.get("user_id"), torrent.get("info_hash")
+        )
         await db.torrents.update_one(
             {"_id": torrent.get("_id")},
-            {"$set": {"is_paused": True, "download_speed": 0}},
+            {"$set": {"is_paused": True, "download_speed": 0, "version": version}},
         )
+        torrent_changes.release(torrent.get("user_id"), version)
+
+
+async def get_changes(user_id, since):
+    """Torrents of a user changed and removed after a version
+
+    Args:
+        user_id (str): user id
+        since (int): version the client has
+
+    Returns:
+        dict: version to sync from next time, changed torrents and removed
+            info_hash or url_hash, reset is True if the client has to reload
+            the list
+    """
+
+    # Writes may land out of order, everything up to synced has landed
+    # before the read, later versions are fetched again next time
+    synced = torrent_changes.synced(user_id)
+
+    removed = torrent_changes.removed_since(user_id, since)
+    if removed is None:
+        return {"reset": True, "version": None, "torrents": [], "removed": []}
+    removed, version = removed
+
+    torrents = await db.torrents.find(
+        {"user_id": ObjectId(user_id), "version": {"$gt": since}},
+        {"_id": False, "user_id": False},
+    ).to_list(length=None)
+
+    version = max([version] + [torrent["version"] for torrent in torrents])
+    version = max(since, min(version, synced))
+
+    # Removed and added again
+    keys = {
+        torrent.get("info_hash") or torrent.get("url_hash") for torrent in torrents
+    }
+    return {
+        "reset": False,
+        "version": version,
+        "torrents": torrents,
+        "removed": [key for key in removed if key not in keys],
+    }
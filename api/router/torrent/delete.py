@@ -1,12 +1,14 @@
 import os
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from shared.factory import db, redis
+from shared.factory import db, redis, async_redis
 from ..auth.common import authenticate_user
 from bson import ObjectId
 from ..files.delete import delete_dir
 import asyncio
 from shared.sockets import emit
+from shared.engine import engine, send_command
+from .common import torrent_changes
 from .download_status import get_download_status
 
 router = APIRouter()
@@ -30,20 +32,14 @@ async def delete_torrent(request: DeleteTorrentRequest, request_obj: Request):
         if not torrent:
             raise HTTPException(status_code=404, detail="Torrent not found")
 
-        redis.set(f"{user_id}/{torrent['url_hash']}/stop", 1)
-
         await db.torrents.update_one(
             {"_id": torrent["_id"]}, {"$set": {"is_paused": True}}
         )
 
-        # Check the status in the database every 1 second
-        while True:
-            updated_torrent = await db.torrents.find_one(
-                {"_id": torrent["_id"]}, {"is_paused": True}
-            )
-            if updated_torrent["is_paused"]:
-                break
-            await asyncio.sleep(1)
+        # Wait until a running download has stopped writing to save_dir
+        channel = f"control:{user_id}/{torrent['url_hash']}"
+        if redis.publish(channel, "stop"):
+            await async_redis.blpop(f"{channel}/stopped", 10)
 
         public_urls_cursor = db.public_urls.find(
             {
@@ -64,6 +60,7 @@ async def delete_torrent(request: DeleteTorrentRequest, request_obj: Request):
             delete_dir(save_dir)
 
         await db.torrents.delete_one({"_id": torrent["_id"]})
+        torrent_changes.record(user_id, url_hash, "removed")
 
         emit(
             f"/stc/torrent-added-or-removed",
@@ -89,16 +86,14 @@ async def delete_torrent(request: DeleteTorrentRequest, request_obj: Request):
                 await db.torrents.update_one(
                     {"_id": torrent["_id"]}, {"$set": {"is_paused": True}}
                 )
-                redis.set(f"{user_id}/{torrent['info_hash']}/stop", 1)
 
-                # Check the status in the database every 1 second
-                while True:
-                    updated_torrent = await db.torrents.find_one(
-                        {"_id": torrent["_id"]}, {"is_paused": True}
-                    )
-                    if updated_torrent["is_paused"]:
-                        break
-                    await asyncio.sleep(1)
+            # Unsubscribe finished torrents too, so the engine neither keeps
+            # seeding them for the user nor links their files again. Files are
+            # hard links to the engine's content store, so the user's
+            # directory can be removed while the engine stops.
+            send_command(
+                "pause", user_id=user_id, info_hash=torrent["info_hash"], link=False
+            )
 
             public_urls_cursor = db.public_urls.find(
                 {
@@ -119,6 +114,8 @@ async def delete_torrent(request: DeleteTorrentRequest, request_obj: Request):
                 delete_dir(save_dir)
 
             await db.torrents.delete_one({"_id": torrent["_id"]})
+            engine.forget(user_id, torrent["info_hash"])
+            torrent_changes.record(user_id, torrent["info_hash"], "removed")
 
             emit(
                 f"/stc/torrent-added-or-removed",
@@ -0,0 +1,77 @@
+from typing import List
+from fastapi import APIRouter, Request, HTTPException
+from pydantic import BaseModel
+from shared.factory import db
+from shared.engine import request_command, send_command
+from ..auth.common import authenticate_user
+from bson import ObjectId
+
+router = APIRouter()
+
+
+class FilePrioritiesDto(BaseModel):
+    info_hash: str
+    priorities: List[int]  # one per file, 0 skips a file, 1 (low) to 7 (high)
+
+
+@router.get("/files")
+async def torrent_files(info_hash: str, request: Request):
+    user_id = authenticate_user(request.cookies.get("session_token")).decode("utf-8")
+
+    torrent = await db.torrents.find_one(
+        {"info_hash": info_hash, "user_id": ObjectId(user_id)},
+        {"_id": True, "file_priorities": True},
+    )
+    if not torrent:
+        raise HTTPException(status_code=404, detail="Torrent not found")
+
+    files = await request_command("files", info_hash=info_hash)
+    if files is None:
+        raise HTTPException(status_code=404, detail="Torrent metadata not available")
+
+    # Report the user's own selection, the engine may download more files
+    # for other users of the same torrent
+    selection = torrent.get("file_priorities")
+    for file in files:
+        if selection and file["index"] < len(selection):
+            file["priority"] = selection[file["index"]]
+        elif file["priority"] is None:
+            file["priority"] = 4
+
+    return {"data": files}
+
+
+@router.post("/file-priorities")
+async def set_file_priorities(dto: FilePrioritiesDto, request: Request):
+    user_id = authenticate_user(request.cookies.get("session_token")).decode("utf-8")
+
+    torrent = await db.torrents.find_one(
+        {"info_hash": dto.info_hash, "user_id": ObjectId(user_id)},
+        {"_id": True},
+    )
+    if not torrent:
+        raise HTTPException(status_code=404, detail="Torrent not found")
+
+    files = await request_command("files", info_hash=dto.info_hash)
+    if files is None:
+        raise HTTPException(status_code=404, detail="Torrent metadata not available")
+
+    if len(dto.priorities) != len(files):
+        raise HTTPException(status_code=400, detail="One priority per file required")
+    if any(priority < 0 or priority > 7 for priority in dto.priorities):
+        raise HTTPException(status_code=400, detail="Priorities must be 0 to 7")
+    if not any(dto.priorities):
+        raise HTTPException(status_code=400, detail="Select at least one file")
+
+    await db.torrents.update_one(
+        {"_id": torrent["_id"]},
+        {"$set": {"file_priorities": dto.priorities}},
+    )
+    send_command(
+        "file_priorities",
+        user_id=user_id,
+        info_hash=dto.info_hash,
+        priorities=dto.priorities,
+    )
+
+    return {"message": "success"}
@@ -3,7 +3,9 @@ from shared.factory import db, redis
 from ..auth.common import authenticate_user
 from bson import ObjectId
 from shared.sockets import emit
+from shared.engine import send_command
 from .download_status import get_download_status
+from .common import torrent_changes
 
 router = APIRouter()
 
@@ -18,17 +20,13 @@ async def pause_torrent(info_hash: str, request: Request):
             {"url_hash": url_hash, "user_id": ObjectId(user_id)},
         )
         if torrent:
-            db.torrents.update_one(
+            version = torrent_changes.record(user_id, url_hash)
+            await db.torrents.update_one(
                 {"_id": torrent["_id"]},
-                {
-                    "$set": {
-                        "is_paused": True,
-                        "download_speed": 0,
-                    }
-                },
+                {"$set": {"is_paused": True, "download_speed": 0, "version": version}},
             )
-            key = f"{user_id}/{torrent['url_hash']}/stop"
-            redis.set(key, 1)
+            torrent_changes.release(user_id, version)
+            redis.publish(f"control:{user_id}/{torrent['url_hash']}", "stop")
             emit(
                 f"/stc/torrent-added-or-removed",
                 {"action": "paused", "url_hash": url_hash},
@@ -45,11 +43,13 @@ async def pause_torrent(info_hash: str, request: Request):
         )
 
         if torrent:
-            db.torrents.update_one(
+            version = torrent_changes.record(user_id, info_hash)
+            await db.torrents.update_one(
                 {"_id": torrent["_id"]},
-                {"$set": {"is_paused": True, "is_finished": False}},
+                {"$set": {"is_paused": True, "is_finished": False, "version": version}},
             )
-            redis.set(f"{user_id}/{torrent['info_hash']}/stop", 1)
+            torrent_changes.release(user_id, version)
+            send_command("pause", user_id=user_id, info_hash=torrent["info_hash"])
             return {"message": "success"}
 
         raise HTTPException(status_code=404, detail="Torrent not found")
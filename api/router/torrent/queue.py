@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Request, HTTPException
+from pydantic import BaseModel
+from shared.factory import db
+from shared.engine import request_command
+from shared.modules.libtorrentx.queue import QUEUE_ACTIONS
+from ..auth.common import authenticate_user
+from bson import ObjectId
+
+router = APIRouter()
+
+
+class QueueMoveDto(BaseModel):
+    info_hash: str
+    action: str  # top, up, down or bottom, relative to the user's torrents
+
+
+@router.get("/queue")
+async def torrent_queue(request: Request):
+    user_id = authenticate_user(request.cookies.get("session_token")).decode("utf-8")
+
+    return {"data": await request_command("queue", user_id=user_id)}
+
+
+@router.post("/queue")
+async def move_in_queue(dto: QueueMoveDto, request: Request):
+    user_id = authenticate_user(request.cookies.get("session_token")).decode("utf-8")
+
+    if dto.action not in QUEUE_ACTIONS:
+        raise HTTPException(status_code=400, detail="Invalid queue action")
+
+    torrent = await db.torrents.find_one(
+        {"info_hash": dto.info_hash, "user_id": ObjectId(user_id)},
+        {"_id": True},
+    )
+    if not torrent:
+        raise HTTPException(status_code=404, detail="Torrent not found")
+
+    if not await request_command(
+        "queue_move", user_id=user_id, info_hash=dto.info_hash, action=dto.action
+    ):
+        raise HTTPException(status_code=400, detail="Torrent is not queued")
+
+    return {"message": "success"}
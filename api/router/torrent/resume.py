@@ -1,8 +1,7 @@
 from fastapi import APIRouter, Request, HTTPException
 from shared.factory import db, redis
 from ..auth.common import authenticate_user
-from .common import update_to_db
-from shared.modules.libtorrentx import LibTorrentSession
+from .common import start_torrent, torrent_changes
 from shared.sockets import emit
 from bson import ObjectId
 from tasks.download_from_url import download_from_url
@@ -21,10 +20,18 @@ async def resume_torrent(info_hash: str, request: Request):
         )
         if torrent:
             if torrent.get("is_paused") and (not torrent.get("is_finished")):
+                version = torrent_changes.record(user_id, url_hash)
                 await db.torrents.update_one(
                     {"_id": torrent.get("_id")},
-                    {"$set": {"is_paused": False, "is_finished": False}},
+                    {
+                        "$set": {
+                            "is_paused": False,
+                            "is_finished": False,
+                            "version": version,
+                        }
+                    },
                 )
+                torrent_changes.release(user_id, version)
 
             result = download_from_url.delay(
                 torrent.get("url"), url_hash, torrent.get("save_dir"), str(user_id)
@@ -47,31 +54,37 @@ async def resume_torrent(info_hash: str, request: Request):
                 "is_paused": True,
                 "is_finished": True,
                 "magnet": True,
+                "file_priorities": True,
+                "preview": True,
+                "sequential_file": True,
             },
         )
 
-        lt_session = LibTorrentSession(redis=redis)
         lt_session_eligible = False
 
         if torrent:
             if torrent.get("is_paused") and (not torrent.get("is_finished")):
+                version = torrent_changes.record(user_id, info_hash)
                 await db.torrents.update_one(
                     {"_id": torrent.get("_id")},
-                    {"$set": {"is_paused": False, "is_finished": False}},
+                    {
+                        "$set": {
+                            "is_paused": False,
+                            "is_finished": False,
+                            "version": version,
+                        }
+                    },
                 )
+                torrent_changes.release(user_id, version)
                 lt_session_eligible = True
 
         if lt_session_eligible:
-            redis.delete(f"{user_id}/{torrent['info_hash']}/stop")
-            redis.delete(f"{user_id}/{info_hash}/copied_from_existing")
-
-            handle = lt_session.add_torrent(
-                torrent.get("magnet"), f"/downloads/{user_id}"
-            )
-            handle.set_callback(
-                lambda props: update_to_db(props, ObjectId(user_id)),
-                callback_interval=1,
-                user_id=user_id,
+            start_torrent(
+                torrent.get("magnet"),
+                user_id,
+                torrent.get("file_priorities"),
+                preview=torrent.get("preview", False),
+                sequential_file=torrent.get("sequential_file"),
             )
 
             return {"message": "Magnet Exists" if torrent else "Magnet Added"}
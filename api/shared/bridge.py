@@ -0,0 +1,47 @@
+import asyncio
+import traceback
+
+
+class LoopBridge:
+    """Hands coroutines from worker threads (engine status consumer, redis
+    subscribers) to the app's event loop
+
+    Threads put work on a queue with call_soon_threadsafe, a single task on
+    the loop awaits it in order. No event loop is created per call and no
+    coroutine is left unawaited.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.queue = None
+
+    def start(self):
+        """Attach to the running loop and start consuming, called from the
+        app's startup hook"""
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.loop.create_task(self.consume())
+
+    @property
+    def running(self):
+        return self.loop is not None and not self.loop.is_closed()
+
+    def submit(self, function, *args):
+        """Run an async function on the loop, callable from any thread
+
+        Args:
+            function (coroutine function): function to await on the loop
+        """
+
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (function, args))
+
+    async def consume(self):
+        while True:
+            function, args = await self.queue.get()
+            try:
+                await function(*args)
+            except Exception:
+                traceback.print_exc()
+
+
+bridge = LoopBridge()
@@ -0,0 +1,205 @@
+import time
+
+VERSION_KEY = "torrents:version:{}"
+REMOVED_STREAM = "torrents:removed:{}"
+REMOVED_LOW_KEY = "torrents:removed:{}:low"
+IN_FLIGHT_KEY = "torrents:inflight:{}"
+
+# Takes the next version and, in the same step, either logs a removal or
+# registers the version as in flight until its write is released. Versions
+# in flight are scored by when they are given up on.
+RECORD_SCRIPT = """
+local version = redis.call('INCR', KEYS[1])
+if ARGV[1] == 'removed' then
+    redis.call('XADD', KEYS[3], '*', 'version', version, 'key', ARGV[3])
+else
+    redis.call('ZADD', KEYS[2], ARGV[2], version)
+end
+return version
+"""
+
+
+class ChangeLog:
+    """Numbers changes of a user's torrents with a per-user version which only
+    increases, and keeps recent removals in a redis stream
+
+    Torrent documents store the version of their last change, so torrents
+    changed since a version are found in mongo. Removed torrents are only
+    known from the stream, which keeps the last maxlen removals of a user.
+    The highest version trimmed from it is kept as a low-water mark, clients
+    behind it have to reload the whole list.
+
+    Versions are taken before documents are written and writes may land out
+    of order, so versions of updates are in flight until released once
+    written. Only versions below the lowest one in flight count as synced.
+    Versions never released (e.g. a failed write) are given up on after
+    in_flight_timeout seconds.
+    """
+
+    def __init__(self, redis, async_redis=None, maxlen=1000, in_flight_timeout=60):
+        self.redis = redis
+        self.async_redis = async_redis
+        self.maxlen = maxlen
+        self.in_flight_timeout = in_flight_timeout
+
+    def version(self, user_id):
+        return int(self.redis.get(VERSION_KEY.format(user_id)) or 0)
+
+    def _record_args(self, user_id, key="", action="updated"):
+        return (
+            RECORD_SCRIPT,
+            3,
+            VERSION_KEY.format(user_id),
+            IN_FLIGHT_KEY.format(user_id),
+            REMOVED_STREAM.format(user_id),
+            action,
+            time.time() + self.in_flight_timeout,
+            key,
+        )
+
+    def release(self, user_id, *versions):
+        """Mark versions of a user as written, see record
+
+        Args:
+            user_id (str): user id
+            versions (int): versions returned by record
+        """
+
+        if versions:
+            self.redis.zrem(IN_FLIGHT_KEY.format(user_id), *versions)
+
+    def synced(self, user_id):
+        """Highest version of a user up to which all changes are written
+
+        Args:
+            user_id (str): user id
+
+        Returns:
+            int: version
+        """
+
+        key = IN_FLIGHT_KEY.format(user_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zremrangebyscore(key, "-inf", time.time())
+        pipe.get(VERSION_KEY.format(user_id))
+        pipe.zrange(key, 0, -1)
+        removed, version, in_flight = pipe.execute()
+
+        version = int(version or 0)
+        if in_flight:
+            version = min(version, min(int(v) for v in in_flight) - 1)
+        return version
+
+    def record(self, user_id, key, action="updated"):
+        """Take the next version of a user for a change of a torrent, removals
+        are logged so clients can learn about them. Versions of updates are
+        in flight until released once the torrent is written.
+
+        Args:
+            user_id (str): user id
+            key (str): info_hash or url_hash of the torrent
+            action (str, optional): updated or removed. Defaults to "updated".
+
+        Returns:
+            int: version to store with the torrent
+        """
+
+        version = self.redis.eval(*self._record_args(user_id, key, action))
+        if action == "removed":
+            self._trim(user_id)
+        return version
+
+    def _trim(self, user_id, slack=100):
+        stream = REMOVED_STREAM.format(user_id)
+        excess = self.redis.xlen(stream) - self.maxlen
+        if excess < slack:
+            return
+
+        entries = self.redis.xrange(stream, count=excess)
+        low = max(int(fields[b"version"]) for entry_id, fields in entries)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.xdel(stream, *[entry_id for entry_id, fields in entries])
+        pipe.set(REMOVED_LOW_KEY.format(user_id), low)
+        pipe.execute()
+
+    def _stamps(self, filters, versions):
+        versions = dict(zip(self._users(filters), versions))
+        return [{"version": versions[str(filter["user_id"])]} for filter in filters]
+
+    def _released(self, filters, stamps):
+        versions = {}
+        for filter, stamp in zip(filters, stamps):
+            versions.setdefault(str(filter["user_id"]), set()).add(stamp["version"])
+        return versions
+
+    def _users(self, filters):
+        return list(dict.fromkeys(str(filter["user_id"]) for filter in filters))
+
+    def stamp(self, filters):
+        """Versions of a batch of buffered updates, see WriteBehind.flush. All
+        updates of a user in the batch share one version, in flight until
+        unstamp is called.
+
+        Args:
+            filters (list): filters of the torrents, with user_id
+
+        Returns:
+            list: fields to set on each torrent
+        """
+
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in self._users(filters):
+            pipe.eval(*self._record_args(user_id))
+        return self._stamps(filters, pipe.execute())
+
+    async def stamp_async(self, filters):
+        """stamp with the asyncio client, for flushes on the event loop"""
+        pipe = self.async_redis.pipeline(transaction=False)
+        for user_id in self._users(filters):
+            pipe.eval(*self._record_args(user_id))
+        return self._stamps(filters, await pipe.execute())
+
+    def unstamp(self, filters, stamps):
+        """Release versions of a batch once written or failed, see stamp
+
+        Args:
+            filters (list): filters passed to stamp
+            stamps (list): fields returned by stamp
+        """
+
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id, versions in self._released(filters, stamps).items():
+            pipe.zrem(IN_FLIGHT_KEY.format(user_id), *versions)
+        pipe.execute()
+
+    async def unstamp_async(self, filters, stamps):
+        """unstamp with the asyncio client, for flushes on the event loop"""
+        pipe = self.async_redis.pipeline(transaction=False)
+        for user_id, versions in self._released(filters, stamps).items():
+            pipe.zrem(IN_FLIGHT_KEY.format(user_id), *versions)
+        await pipe.execute()
+
+    def removed_since(self, user_id, since):
+        """Torrents removed after a version
+
+        Args:
+            user_id (str): user id
+            since (int): version the client has
+
+        Returns:
+            tuple: info_hash or url_hash of removed torrents and the highest
+                version among them, None if removals since that version are
+                no longer kept
+        """
+
+        low = int(self.redis.get(REMOVED_LOW_KEY.format(user_id)) or 0)
+        if since < low or since > self.version(user_id):
+            return None
+
+        # Only removals are kept, the stream is short enough to read whole
+        removed, version = [], since
+        for entry_id, fields in self.redis.xrange(REMOVED_STREAM.format(user_id)):
+            if int(fields[b"version"]) > since:
+                removed.append(fields[b"key"].decode())
+                version = max(version, int(fields[b"version"]))
+        return removed, version
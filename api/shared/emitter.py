@@ -0,0 +1,13 @@
+import socketio
+from shared.env import REDIS_URL
+
+# Write-only client manager for processes without a Socket.IO server (celery
+# tasks), emits are published on redis and delivered by the API workers
+external_sio = socketio.RedisManager(REDIS_URL, write_only=True)
+
+
+def emit_external(event_name, data, user_id):
+    try:
+        external_sio.emit(event_name, data=data, room=str(user_id))
+    except Exception as e:
+        print(e)
@@ -0,0 +1,18 @@
+from fastapi import HTTPException
+from .factory import redis, async_redis
+from .modules.libtorrentx import EngineClient
+
+# The libtorrent session lives in the engine daemon (engine_worker.py), the
+# API only sends commands to it and consumes the status it publishes
+engine = EngineClient(redis, async_redis=async_redis)
+
+
+def send_command(command, **args):
+    engine.send(command, **args)
+
+
+async def request_command(command, timeout=10, **args):
+    try:
+        return await engine.request(command, timeout=timeout, **args)
+    except TimeoutError:
+        raise HTTPException(status_code=503, detail="Torrent engine not responding")
@@ -13,9 +13,46 @@ API_COOKIES_EXPIRE_MINUTES = int(os.environ.get("API_COOKIES_EXPIRE_MINUTES", 43
 REDIS_HOST = os.environ.get("REDIS_HOST", None)
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", None)
+REDIS_URL = f"redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0"
 
 # Load mongodb credentials
 MONGO_DATABASE_URI = os.environ.get("MONGO_DATABASE_URI", None)
 MONGO_DATABASE_NAME = os.environ.get("MONGO_DATABASE_NAME", None)
 
+# Fast resume data of torrents, used to restart them without rechecking
+TORRENT_RESUME_DIR = os.environ.get("TORRENT_RESUME_DIR", "/downloads/.resume")
+
+# Metadata of torrents keyed by info_hash, so magnets are not refetched from peers
+TORRENT_METADATA_DIR = os.environ.get("TORRENT_METADATA_DIR", "/downloads/.metadata")
+
+# Content of every torrent downloaded once, hard linked into users' directories
+TORRENT_STORE_DIR = os.environ.get("TORRENT_STORE_DIR", "/downloads/.store")
+
+# libtorrent session state (DHT routing table, settings) kept across restarts
+TORRENT_STATE_FILE = os.environ.get("TORRENT_STATE_FILE", "/downloads/.session.state")
+
+# libtorrent disk I/O and memory profile: auto, low-memory, balanced, high-throughput
+TORRENT_PROFILE = os.environ.get("TORRENT_PROFILE", "auto")
+
+# Torrents downloading / seeding at once, the rest wait in the queue
+TORRENT_ACTIVE_DOWNLOADS = int(os.environ.get("TORRENT_ACTIVE_DOWNLOADS", 5))
+TORRENT_ACTIVE_SEEDS = int(os.environ.get("TORRENT_ACTIVE_SEEDS", 10))
+TORRENT_ACTIVE_LIMIT = int(os.environ.get("TORRENT_ACTIVE_LIMIT", 20))
+
+# Bandwidth limits in bytes/s (0 for unlimited), of the whole engine and the
+# default per user, admins can change them at runtime
+TORRENT_DOWNLOAD_LIMIT = int(os.environ.get("TORRENT_DOWNLOAD_LIMIT", 0))
+TORRENT_UPLOAD_LIMIT = int(os.environ.get("TORRENT_UPLOAD_LIMIT", 0))
+TORRENT_USER_DOWNLOAD_LIMIT = int(os.environ.get("TORRENT_USER_DOWNLOAD_LIMIT", 0))
+TORRENT_USER_UPLOAD_LIMIT = int(os.environ.get("TORRENT_USER_UPLOAD_LIMIT", 0))
+
+# Seeding stops at this upload ratio or after these minutes (0 for no limit),
+# seed while idle pauses seeding while any torrent is downloading
+TORRENT_MAX_RATIO = float(os.environ.get("TORRENT_MAX_RATIO", 0))
+TORRENT_MAX_SEED_MINUTES = int(os.environ.get("TORRENT_MAX_SEED_MINUTES", 0))
+TORRENT_SEED_WHILE_IDLE = os.environ.get("TORRENT_SEED_WHILE_IDLE", "False") == "True"
+
+# Seconds between snapshots of a user's torrents sent over socket.io
+SOCKET_SNAPSHOT_INTERVAL = float(os.environ.get("SOCKET_SNAPSHOT_INTERVAL", 1))
+
 JACKETT_API_KEY = os.environ.get("JACKETT_API_KEY", None)
@@ -1,6 +1,7 @@
 import os
 import motor.motor_asyncio
 from redis import Redis
+from redis import asyncio as aioredis
 from .env import *
 from .modules.jackett import AsyncJackett
 
@@ -14,6 +15,14 @@ redis = Redis(
     db=0,
 )
 
+# Used by coroutines on the app's event loop
+async_redis = aioredis.Redis(
+    host=REDIS_HOST,
+    password=REDIS_PASSWORD,
+    port=REDIS_PORT,
+    db=0,
+)
+
 
 def get_db():
     # Initialize MongoDB
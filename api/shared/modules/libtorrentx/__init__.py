@@ -1,2 +1,3 @@
 from .session import LibTorrentSession
 from .magnet import MagnetUtils
+from .daemon import EngineDaemon, EngineClient
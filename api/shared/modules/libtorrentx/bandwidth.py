@@ -0,0 +1,145 @@
+from .profiles import apply_settings
+
+
+class BandwidthLimits:
+    def __init__(self, user_download_limit=0, user_upload_limit=0):
+        self.default_user_limits = {
+            "download_limit": user_download_limit,
+            "upload_limit": user_upload_limit,
+        }
+        self.user_limits = {}
+        self.bandwidth_dirty = False
+
+    def get_bandwidth_limits(self):
+        """Get global and per-user bandwidth limits
+
+        Returns:
+            dict: limits in bytes/s, 0 is unlimited
+        """
+
+        settings = self.session.get_settings()
+        return {
+            "download_limit": settings.get("download_rate_limit", 0),
+            "upload_limit": settings.get("upload_rate_limit", 0),
+            "user_default": dict(self.default_user_limits),
+            "users": {
+                user_id: dict(limits) for user_id, limits in self.user_limits.items()
+            },
+        }
+
+    def set_global_limits(self, download_limit=None, upload_limit=None):
+        """Limit bandwidth of the whole session
+
+        Args:
+            download_limit (int, optional): bytes/s, 0 for unlimited. Defaults to None.
+            upload_limit (int, optional): bytes/s, 0 for unlimited. Defaults to None.
+        """
+
+        settings = {}
+        if download_limit is not None:
+            settings["download_rate_limit"] = download_limit
+        if upload_limit is not None:
+            settings["upload_rate_limit"] = upload_limit
+
+        if settings:
+            apply_settings(self.session, settings)
+
+    def set_user_limits(self, user_id, download_limit=None, upload_limit=None):
+        """Limit bandwidth of a user, shared by the user's torrents
+
+        Args:
+            user_id (str): user id, None to change the default of all users
+            download_limit (int, optional): bytes/s, 0 for unlimited. Defaults to None.
+            upload_limit (int, optional): bytes/s, 0 for unlimited. Defaults to None.
+        """
+
+        if user_id is None:
+            limits = self.default_user_limits
+        else:
+            limits = self.user_limits.setdefault(
+                user_id, dict(self.default_user_limits)
+            )
+
+        if download_limit is not None:
+            limits["download_limit"] = download_limit
+        if upload_limit is not None:
+            limits["upload_limit"] = upload_limit
+
+        self.bandwidth_dirty = True
+
+    def _transferring(self, status):
+        """Directions a torrent is transferring in
+
+        Args:
+            status (lt.torrent_status): status of the torrent
+
+        Returns:
+            tuple: (downloading, uploading)
+        """
+
+        return (not status.paused and not status.is_finished, not status.paused)
+
+    def update_transferring(self, handle, status):
+        """Recompute limits once a torrent starts or stops transferring in a
+        direction, e.g. it was started by the queue, paused or finished
+
+        Args:
+            handle (TorrentHandleWrapper): torrent
+            status (lt.torrent_status): its new status
+        """
+
+        transferring = self._transferring(status)
+        if transferring != handle.transferring:
+            handle.transferring = transferring
+            self.bandwidth_dirty = True
+
+    def apply_bandwidth_limits(self):
+        """Split the limits of each user evenly over the user's torrents
+        which transfer in that direction
+
+        Peer classes can not be assigned per torrent from python, so user
+        limits are enforced as torrent limits instead. A torrent shared by
+        several users gets the sum of their shares and is unlimited if any
+        of its users is. Queued, paused and (for downloads) finished torrents
+        get the share they would have once started, until limits are
+        recomputed.
+        """
+
+        with self.lock:
+            handles = list(self.handles.values())
+            counts = {}
+            for handle in handles:
+                handle.transferring = self._transferring(handle.handle.status(0))
+                for user_id in handle.save_dirs:
+                    user_counts = counts.setdefault(user_id, [0, 0])
+                    for direction, active in enumerate(handle.transferring):
+                        user_counts[direction] += active
+
+            for handle in handles:
+                for direction, (key, apply) in enumerate(
+                    (
+                        ("download_limit", handle.handle.set_download_limit),
+                        ("upload_limit", handle.handle.set_upload_limit),
+                    )
+                ):
+                    active = handle.transferring[direction]
+                    limits = [
+                        (
+                            self.user_limits.get(
+                                user_id, self.default_user_limits
+                            )[key],
+                            counts[user_id][direction] + (not active),
+                        )
+                        for user_id in handle.save_dirs
+                    ]
+                    if not limits or not all(limit for limit, count in limits):
+                        apply(0)
+                    else:
+                        apply(sum(max(limit // count, 1) for limit, count in limits))
+
+    def handle_bandwidth(self):
+        """Recompute torrent limits after users, torrents or their transfer
+        state changed"""
+        if self.bandwidth_dirty:
+            self.bandwidth_dirty = False
+            self.apply_bandwidth_limits()
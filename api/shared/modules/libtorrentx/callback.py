@@ -1,66 +1,143 @@
 import threading
 import traceback
 import time
-import asyncio
+from .profiles import STATUS_FLAGS
 
 
 class TorrentCallBack:
     def __init__(self):
-        self.callback_thread_running = False
         self.lock = threading.Lock()
-        self.stop_event = asyncio.Event()
+        self.callbacks = {}
+        self.pending = set()
+        self.finished_notified = False
 
-    def set_callback(self, callback, callback_interval=1, user_id=None):
-        """Set callback function
+    def set_callback(self, callback, user_id=None):
+        """Set callback function, one callback is kept per user
+
+        Callbacks are invoked by the session's status pump whenever the
+        torrent status changes, see SessionCallBack.
 
         Args:
             callback (function): callback function
-            callback_interval (int, optional): callback interval in seconds. Defaults to 1.
+            user_id (str, optional): user subscribing to the torrent. Defaults to None.
         """
-        self.user_id = user_id
-        self.callback = callback
-        self.callback_interval = callback_interval
-        self.start_callback()
-
-    def remove_callback(self):
-        """Remove callback function"""
-        self.callback = None
-        self.callback_thread_running = False
-
-    def start_callback(self):
-        if self.callback and (not self.callback_thread_running):
-            self.callback_thread_running = True
-            thread = threading.Thread(target=self.handle_callback)
-            thread.daemon = True
-            thread.start()
-
-    def stop_callback(self):
-        self.callback_thread_running = False
-
-    def handle_callback(self):
-        """Handle callback, this can be used to update to db in the background"""
-        while self.callback_thread_running:
-            props = self.props()
-
-            if not props.ok:
-                time.sleep(1)
-                continue
+        self.callbacks[user_id] = callback
+        self.pending.add(user_id)
+
+    def remove_callback(self, user_id=None):
+        """Remove callback function
+
+        Args:
+            user_id (str, optional): user to unsubscribe, all users if None. Defaults to None.
+        """
+        if user_id is None:
+            self.callbacks.clear()
+            self.pending.clear()
+        else:
+            self.callbacks.pop(user_id, None)
+            self.pending.discard(user_id)
 
-            key = f"{self.user_id}/{self.info_hash}/stop"
-            if self.session.redis.get(key) == b"1":
-                self.session.redis.delete(key)
-                self.callback(self.props(paused=True))
-                self.stop()
-                break
+    def notify(self, props, users=None):
+        """Fan torrent properties out to subscribed callbacks
+
+        Args:
+            props (TorrentProps): torrent properties
+            users (set, optional): only notify these users. Defaults to None.
+        """
+        if not props.ok:
+            return
+
+        for user_id, callback in list(self.callbacks.items()):
+            if users is not None and user_id not in users:
+                continue
 
             try:
                 with self.lock:
-                    self.callback(props)
+                    callback(props)
+            except Exception:
+                traceback.print_exc()
+
+
+class SessionCallBack:
+    def __init__(self, pump_interval=1):
+        self.pump_interval = pump_interval
+        self.pump_running = False
+        self.pump_thread = None
+
+    def start_pump(self):
+        """Start the status pump thread, one per session"""
+        if not self.pump_running:
+            self.pump_running = True
+            self.pump_thread = threading.Thread(target=self.handle_pump)
+            self.pump_thread.daemon = True
+            self.pump_thread.start()
+
+    def stop_pump(self, timeout=None):
+        """Stop the status pump and wait for its current iteration to end, so
+        no other thread pops alerts afterwards
+
+        Args:
+            timeout (float, optional): seconds to wait. Defaults to None.
+        """
+
+        self.pump_running = False
+        thread, self.pump_thread = self.pump_thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def handle_pump(self):
+        """Request status of all changed torrents once per interval and
+        dispatch resulting alerts to on_<alert type> handlers"""
+        while self.pump_running:
+            started = time.time()
+
+            try:
+                self.session.post_torrent_updates(STATUS_FLAGS)
+                self.session.wait_for_alert(int(self.pump_interval * 1000))
+                for alert in self.session.pop_alerts():
+                    handler = getattr(self, f"on_{alert.what()}", None)
+                    if handler:
+                        handler(alert)
+
+                self.handle_pending()
+                self.handle_queue()
+                self.handle_bandwidth()
+                self.handle_seeding()
+                self.handle_preview()
+                self.handle_store()
+                self.handle_resume_data()
+                self.handle_session_state()
             except Exception:
-                time.sleep(1)
                 traceback.print_exc()
 
-            if props.is_finished:
-                self.callback_thread_running = False
+            time.sleep(max(self.pump_interval - (time.time() - started), 0))
+
+    def on_state_update(self, alert):
+        """Fan out status of torrents changed since the last update, under the
+        session lock so users unsubscribed meanwhile are not notified"""
+        with self.lock:
+            for status in alert.status:
+                handle = self.handles.get(str(status.info_hash).lower())
+                if not handle:
+                    continue
+
+                self.update_transferring(handle, status)
+
+                props = handle.props(status=status)
+                if props.is_finished and handle.finished_notified:
+                    continue
+
+                handle.notify(props)
+                handle.finished_notified = bool(props.ok and props.is_finished)
+
+    def handle_pending(self):
+        """Send current status to users subscribed since the last update"""
+        with self.lock:
+            for handle in list(self.handles.values()):
+                if not handle.pending:
+                    continue
 
-            time.sleep(self.callback_interval)
+                props = handle.props()
+                if props.ok:
+                    handle.notify(props, users=set(handle.pending))
+                    handle.pending.clear()
@@ -0,0 +1,492 @@
+import asyncio
+import base64
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+COMMANDS_STREAM = "engine:commands"
+STATUS_STREAM = "engine:status"
+TORRENTS_KEY = "engine:torrents"
+BANDWIDTH_KEY = "engine:bandwidth"
+REPLY_KEY = "engine:reply:{}"
+WRITER_KEY = "engine:status:writer"
+WRITER_CONSUMER = "writer"
+STREAM_MAXLEN = 10000
+
+
+def _create_group(redis, stream, group):
+    try:
+        redis.xgroup_create(stream, group, id="$", mkstream=True)
+    except Exception as e:
+        # Group already exists
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+class EngineDaemon:
+    """Owns the libtorrent session in its own process
+
+    Commands are read from a redis stream, status of subscribed torrents is
+    published back in one batch per interval, and torrents subscribed when
+    the daemon stops are restored from fast resume data on the next start.
+    """
+
+    def __init__(self, lt_session, redis, status_interval=1):
+        self.lt_session = lt_session
+        self.redis = redis
+        self.status_interval = status_interval
+        self.status_batch = []
+        self.status_lock = threading.Lock()
+        self.status_flushed_at = time.time()
+        self.loop = asyncio.new_event_loop()
+        self.running = False
+        self.lt_session.subscribed = self.subscribed
+
+    def run(self):
+        """Process commands until SIGINT or SIGTERM"""
+        self.running = True
+        signal.signal(signal.SIGTERM, lambda *args: self.stop())
+        signal.signal(signal.SIGINT, lambda *args: self.stop())
+
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        _create_group(self.redis, COMMANDS_STREAM, "engine")
+        self.restore()
+
+        # Commands read but not acknowledged by a previous run come first
+        stream_id = "0"
+        while self.running:
+            try:
+                entries = self.redis.xreadgroup(
+                    "engine",
+                    "daemon",
+                    {COMMANDS_STREAM: stream_id},
+                    count=100,
+                    block=int(self.status_interval * 1000),
+                )
+                messages = entries[0][1] if entries else []
+                if stream_id == "0" and not messages:
+                    stream_id = ">"
+
+                for message_id, fields in messages:
+                    self.handle_command(fields)
+                    self.redis.xack(COMMANDS_STREAM, "engine", message_id)
+
+                self.flush_status()
+            except Exception:
+                traceback.print_exc()
+                time.sleep(1)
+
+        self.lt_session.shutdown()
+        self.flush_status(force=True)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def stop(self):
+        self.running = False
+
+    def restore(self):
+        """Restart torrents subscribed before the daemon stopped, torrents
+        without resume data are reported as paused"""
+        for scope, limits in self.redis.hgetall(BANDWIDTH_KEY).items():
+            scope = scope.decode()
+            self.cmd_bandwidth(
+                scope=scope if scope in ("global", "default") else "user",
+                user_id=scope,
+                persist=False,
+                **json.loads(limits),
+            )
+
+        for key, value in self.redis.hgetall(TORRENTS_KEY).items():
+            user_id, info_hash = key.decode().split("/")
+            torrent = json.loads(value)
+
+            if self.lt_session.has_resume_data(info_hash):
+                try:
+                    self.cmd_add(user_id=user_id, **torrent)
+                    continue
+                except Exception:
+                    traceback.print_exc()
+
+            self.redis.hdel(TORRENTS_KEY, key)
+            self.publish(
+                user_id,
+                {"info_hash": info_hash, "is_paused": True, "download_speed": 0},
+            )
+
+    def handle_command(self, fields):
+        command = fields[b"command"].decode()
+        args = json.loads(fields[b"args"])
+        reply_to = args.pop("reply_to", None)
+
+        handler = getattr(self, f"cmd_{command}", None)
+        if handler is None:
+            print(f"unknown engine command {command}")
+            return
+
+        try:
+            result = handler(**args)
+        except Exception:
+            traceback.print_exc()
+            result = None
+
+        # Long running commands are awaited on the daemon's event loop
+        if asyncio.iscoroutine(result):
+            future = asyncio.run_coroutine_threadsafe(result, self.loop)
+            if reply_to:
+                future.add_done_callback(
+                    lambda f: self.reply(
+                        reply_to, None if f.exception() else f.result()
+                    )
+                )
+            return
+
+        if reply_to:
+            self.reply(reply_to, result)
+
+    def reply(self, reply_to, result):
+        key = REPLY_KEY.format(reply_to)
+        self.redis.rpush(key, json.dumps({"result": result}))
+        self.redis.expire(key, 60)
+
+    def publish(self, user_id, props):
+        if not isinstance(props, dict):
+            props = props.asdict()
+
+        with self.status_lock:
+            self.status_batch.append({"user_id": user_id, "props": props})
+
+    def flush_status(self, force=False):
+        """Publish status collected from the session pump as one batch"""
+        if not force and time.time() - self.status_flushed_at < self.status_interval:
+            return
+
+        self.status_flushed_at = time.time()
+        with self.status_lock:
+            batch, self.status_batch = self.status_batch, []
+
+        if batch:
+            self.redis.xadd(
+                STATUS_STREAM,
+                {"batch": json.dumps(batch)},
+                maxlen=STREAM_MAXLEN,
+                approximate=True,
+            )
+
+    def cmd_add(
+        self,
+        user_id,
+        save_dir,
+        magnet=None,
+        torrent=None,
+        file_priorities=None,
+        preview=False,
+        sequential_file=None,
+    ):
+        torrent_info = None
+        if torrent:
+            torrent_info = self.lt_session._get_torrent_info(base64.b64decode(torrent))
+
+        handle = self.lt_session.add_torrent(
+            torrent_info or magnet, save_dir, user_id=user_id
+        )
+        handle.set_callback(
+            lambda props: self.publish(user_id, props),
+            user_id=user_id,
+        )
+        if file_priorities:
+            handle.set_file_priorities(user_id, file_priorities)
+        self.lt_session.set_preview(
+            handle.info_hash, preview, sequential_file, user_id=user_id
+        )
+
+        self.redis.hset(
+            TORRENTS_KEY,
+            f"{user_id}/{handle.info_hash}",
+            json.dumps(
+                {
+                    "save_dir": save_dir,
+                    "magnet": handle.magnet,
+                    "file_priorities": file_priorities,
+                    "preview": preview,
+                    "sequential_file": sequential_file,
+                }
+            ),
+        )
+
+    def subscribed(self):
+        """Get info_hashes of torrents subscribed by any user"""
+        return {key.decode().split("/")[1] for key in self.redis.hkeys(TORRENTS_KEY)}
+
+    def cmd_pause(self, user_id, info_hash, link=True):
+        self.redis.hdel(TORRENTS_KEY, f"{user_id}/{info_hash}")
+
+        handle = self.lt_session.handles.get(info_hash)
+        if handle is None or user_id not in handle.callbacks:
+            return
+
+        # Files not linked yet are linked into the user's directory, which
+        # keeps them from being collected from the store while paused
+        if link:
+            self.lt_session.link_content(handle, user_id)
+
+        # Unsubscribed under the lock the status pump notifies under, so no
+        # status it took before is published after the paused one
+        with self.lt_session.lock:
+            props = handle.props(paused=True)
+            handle.unsubscribe(user_id)
+        if props.ok:
+            self.publish(user_id, props)
+
+    def cmd_file_priorities(self, user_id, info_hash, priorities):
+        key = f"{user_id}/{info_hash}"
+        torrent = self.redis.hget(TORRENTS_KEY, key)
+        if torrent:
+            torrent = json.loads(torrent)
+            torrent["file_priorities"] = priorities
+            self.redis.hset(TORRENTS_KEY, key, json.dumps(torrent))
+
+        return self.lt_session.set_file_priorities(info_hash, user_id, priorities)
+
+    def cmd_queue(self, user_id):
+        return self.lt_session.get_queue(user_id)
+
+    def cmd_queue_move(self, user_id, info_hash, action):
+        return self.lt_session.move_in_queue(info_hash, user_id, action)
+
+    def cmd_bandwidth(
+        self,
+        scope,
+        user_id=None,
+        download_limit=None,
+        upload_limit=None,
+        persist=True,
+    ):
+        if scope == "global":
+            self.lt_session.set_global_limits(download_limit, upload_limit)
+        else:
+            user_id = None if scope == "default" else user_id
+            self.lt_session.set_user_limits(user_id, download_limit, upload_limit)
+
+        if persist:
+            key = scope if scope in ("global", "default") else user_id
+            limits = json.loads(self.redis.hget(BANDWIDTH_KEY, key) or "{}")
+            if download_limit is not None:
+                limits["download_limit"] = download_limit
+            if upload_limit is not None:
+                limits["upload_limit"] = upload_limit
+            self.redis.hset(BANDWIDTH_KEY, key, json.dumps(limits))
+
+    def cmd_get_bandwidth(self):
+        return self.lt_session.get_bandwidth_limits()
+
+    def cmd_files(self, info_hash):
+        return self.lt_session.get_files(info_hash)
+
+    def cmd_stream_file(self, info_hash, path):
+        return self.lt_session.get_stream_file(info_hash, path)
+
+    def cmd_wait_for_range(self, info_hash, file_index, start, length, timeout=60):
+        return self.lt_session.wait_for_range(
+            info_hash, file_index, start, length, timeout=timeout
+        )
+
+
+class EngineClient:
+    """Sends commands to an EngineDaemon and consumes its status batches"""
+
+    def __init__(self, redis, group="api", async_redis=None):
+        self.redis = redis
+        self.async_redis = async_redis
+        self.group = group
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+
+    def send(self, command, **args):
+        """Send a command without waiting for it
+
+        Args:
+            command (str): command name, handled by EngineDaemon.cmd_<command>
+        """
+
+        self.redis.xadd(
+            COMMANDS_STREAM,
+            {"command": command, "args": json.dumps(args)},
+            maxlen=STREAM_MAXLEN,
+            approximate=True,
+        )
+
+    async def request(self, command, timeout=10, **args):
+        """Send a command and wait for its result
+
+        Args:
+            command (str): command name, handled by EngineDaemon.cmd_<command>
+            timeout (int, optional): max seconds to wait. Defaults to 10.
+
+        Raises:
+            TimeoutError: daemon did not reply in time
+
+        Returns:
+            any: result of the command
+        """
+
+        reply_to = uuid.uuid4().hex
+        self.send(command, reply_to=reply_to, **args)
+
+        # Without an asyncio client the blocking pop waits in a worker thread
+        if self.async_redis is not None:
+            reply = await self.async_redis.blpop(REPLY_KEY.format(reply_to), timeout)
+        else:
+            reply = await asyncio.get_running_loop().run_in_executor(
+                None, self.redis.blpop, REPLY_KEY.format(reply_to), timeout
+            )
+        if reply is None:
+            raise TimeoutError(f"engine did not reply to {command}")
+
+        return json.loads(reply[1])["result"]
+
+    def subscriptions(self):
+        """Get torrents subscribed in the daemon
+
+        Returns:
+            set: {user_id}/{info_hash} keys
+        """
+
+        return {key.decode() for key in self.redis.hkeys(TORRENTS_KEY)}
+
+    def forget(self, user_id, info_hash):
+        """Have every consumer and listener forget what they know of a
+        torrent of a user, in order with its status
+
+        Args:
+            user_id (str): user id
+            info_hash (str): info_hash
+        """
+
+        self.redis.xadd(
+            STATUS_STREAM,
+            {"batch": json.dumps([{"user_id": user_id, "forget": info_hash}])},
+            maxlen=STREAM_MAXLEN,
+            approximate=True,
+        )
+
+    def start_status_consumer(self, callback, on_forget=None, on_lead=None, lease=15):
+        """Consume status batches of the group in a background thread
+
+        Only the client holding the writer lease consumes, so every status
+        goes through a single consumer in order. A client taking the lease
+        over first handles what the previous holder left unacknowledged.
+
+        Args:
+            callback (function): called with user_id and props of each status
+            on_forget (function, optional): called with user_id and info_hash
+                of torrents to forget. Defaults to None.
+            on_lead (function, optional): called once the client took the
+                lease, before any status is handled. Defaults to None.
+            lease (int, optional): seconds the lease is held without being
+                renewed. Defaults to 15.
+        """
+
+        _create_group(self.redis, STATUS_STREAM, self.group)
+        thread = threading.Thread(
+            target=self.handle_status, args=(callback, on_forget, on_lead, lease)
+        )
+        thread.daemon = True
+        thread.start()
+
+    def start_status_listener(self, callback, on_forget=None):
+        """Read every status batch in a background thread, on every client
+
+        Args:
+            callback (function): called with user_id and props of each status
+            on_forget (function, optional): see start_status_consumer.
+                Defaults to None.
+        """
+
+        thread = threading.Thread(
+            target=self.handle_status_listener, args=(callback, on_forget)
+        )
+        thread.daemon = True
+        thread.start()
+
+    def _lead(self, lease):
+        """Take or renew the writer lease
+
+        Returns:
+            bool: True if this client holds the lease
+        """
+
+        lease = int(lease * 1000)
+        if self.redis.set(WRITER_KEY, self.consumer, nx=True, px=lease):
+            return True
+        if self.redis.get(WRITER_KEY) == self.consumer.encode():
+            self.redis.pexpire(WRITER_KEY, lease)
+            return True
+        return False
+
+    def _handle_batch(self, fields, callback, on_forget):
+        for status in json.loads(fields[b"batch"]):
+            try:
+                if "forget" in status:
+                    if on_forget is not None:
+                        on_forget(status["user_id"], status["forget"])
+                else:
+                    callback(status["user_id"], status["props"])
+            except Exception:
+                traceback.print_exc()
+
+    def handle_status(self, callback, on_forget=None, on_lead=None, lease=15):
+        leading = False
+        stream_id = "0"
+        while True:
+            try:
+                if not self._lead(lease):
+                    leading = False
+                    time.sleep(1)
+                    continue
+
+                if not leading:
+                    leading = True
+                    stream_id = "0"
+                    if on_lead is not None:
+                        on_lead()
+
+                # Every holder of the lease is the same consumer, so "0"
+                # reads what the previous holder left unacknowledged
+                entries = self.redis.xreadgroup(
+                    self.group,
+                    WRITER_CONSUMER,
+                    {STATUS_STREAM: stream_id},
+                    count=10,
+                    block=1000,
+                )
+                messages = entries[0][1] if entries else []
+                if stream_id == "0" and not messages:
+                    stream_id = ">"
+
+                for message_id, fields in messages:
+                    self._handle_batch(fields, callback, on_forget)
+                    self.redis.xack(STATUS_STREAM, self.group, message_id)
+            except Exception:
+                traceback.print_exc()
+                time.sleep(1)
+
+    def handle_status_listener(self, callback, on_forget=None):
+        stream_id = None
+        while True:
+            try:
+                if stream_id is None:
+                    last = self.redis.xrevrange(STATUS_STREAM, count=1)
+                    stream_id = last[0][0] if last else "0-0"
+
+                entries = self.redis.xread(
+                    {STATUS_STREAM: stream_id}, count=10, block=1000
+                )
+                for message_id, fields in entries[0][1] if entries else []:
+                    stream_id = message_id
+                    self._handle_batch(fields, callback, on_forget)
+            except Exception:
+                traceback.print_exc()
+                time.sleep(1)
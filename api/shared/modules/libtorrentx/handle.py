@@ -1,8 +1,13 @@
+import os
 import time
+import libtorrent as lt
 from .callback import TorrentCallBack
+from .profiles import STATUS_FLAGS
 
 
 class Utils:
+    __slots__ = ()
+
     @staticmethod
     def format_bytes(b):
         """Convert byte to human readable format
@@ -25,12 +30,35 @@ class Utils:
 
 
 class TorrentProps(Utils):
+    """Torrent status snapshot, slotted so the status pump allocates one
+    small record per torrent and update instead of a dict"""
+
+    __slots__ = (
+        "name",
+        "info_hash",
+        "download_speed",
+        "downloaded_bytes",
+        "is_finished",
+        "is_paused",
+        "is_queued",
+        "num_connections",
+        "num_peers",
+        "num_seeds",
+        "num_trackers",
+        "progress",
+        "queue_position",
+        "total_bytes",
+        "upload_speed",
+        "save_dir",
+        "ok",
+    )
+
     def __init__(self, **kwargs):
-        for k, v in kwargs.items():
-            setattr(self, k, v)
+        for k in self.__slots__:
+            setattr(self, k, kwargs.get(k))
 
     def __repr__(self):
-        return str(self.__dict__)
+        return str(self.asdict())
 
     @property
     def string(self):
@@ -40,20 +68,20 @@ class TorrentProps(Utils):
             str: torrent properties
         """
         props = [
-            self.__dict__.get("name", "Unknown"),
-            self.format_bytes(self.__dict__.get("downloaded_bytes", 0))
+            self.name or "Unknown",
+            self.format_bytes(self.downloaded_bytes or 0)
             + "/"
-            + self.format_bytes(self.__dict__.get("total_bytes", 0)),
-            self.format_bytes(self.__dict__.get("download_speed", 0)) + "/s",
-            str(self.__dict__.get("num_seeds", 0)) + " Seeds",
-            str(self.__dict__.get("progress", 0)) + "%",
+            + self.format_bytes(self.total_bytes or 0),
+            self.format_bytes(self.download_speed or 0) + "/s",
+            str(self.num_seeds or 0) + " Seeds",
+            str(self.progress or 0) + "%",
         ]
 
         return " - ".join(props)
 
     def asdict(self):
         """Get torrent properties as dict"""
-        return self.__dict__
+        return {k: getattr(self, k) for k in self.__slots__}
 
 
 class TorrentHandleWrapper(TorrentCallBack, Utils):
@@ -65,7 +93,6 @@ class TorrentHandleWrapper(TorrentCallBack, Utils):
         save_dir,
         sequential,
         callback=None,
-        callback_interval=1,
     ):
         TorrentCallBack.__init__(self)
 
@@ -74,21 +101,39 @@ class TorrentHandleWrapper(TorrentCallBack, Utils):
         self.magnet = magnet
         self.save_dir = save_dir
         self.sequential = sequential
-        self.info_hash = str(self.handle.status().info_hash).lower()
-
-        self.callback = callback
-        self.callback_interval = callback_interval
-
-    def props(self, paused=None):
+        self.save_dirs = {}
+        self.info_hash = str(self.handle.info_hash()).lower()
+        self.num_trackers = None
+        self.file_indices = None
+        self.file_priorities = {}
+        self.previews = set()
+        self.preview = False
+        self.preview_applied = False
+        self.sequential_file = None
+        self.sequential_cursor = None
+        self.links_complete = False
+        self.transferring = None
+
+        if callback:
+            self.callbacks[None] = callback
+
+    def props(self, paused=None, status=None):
         """Get torrent properties
 
+        Args:
+            paused (bool, optional): report torrent as paused. Defaults to None.
+            status (lt.torrent_status, optional): status delivered by the session
+                pump, queried from the handle if None. Defaults to None.
+
         Returns:
             dict: torrent properties
         """
 
         try:
-            s = self.handle.status()
-            name = self.handle.name() or "Unknown"
+            s = status or self.handle.status(STATUS_FLAGS)
+            name = s.name or "Unknown"
+            if self.num_trackers is None:
+                self.num_trackers = len(self.handle.trackers())
         except Exception as e:
             return TorrentProps(ok=False)
 
@@ -97,12 +142,13 @@ class TorrentHandleWrapper(TorrentCallBack, Utils):
             info_hash=self.info_hash,
             download_speed=(0 if paused else (s.download_rate + 1)),
             downloaded_bytes=s.total_wanted_done,
-            is_finished=self.handle.is_finished(),
-            is_paused=(paused or s.paused),
+            is_finished=s.is_finished,
+            is_paused=bool(paused or (s.paused and not s.auto_managed)),
+            is_queued=bool(not paused and s.paused and s.auto_managed),
             num_connections=s.num_connections,
             num_peers=s.num_peers,
             num_seeds=s.num_seeds,
-            num_trackers=len(self.handle.trackers()),
+            num_trackers=self.num_trackers,
             progress=int(s.progress * 100),
             queue_position=s.queue_position,
             total_bytes=s.total_wanted,
@@ -111,6 +157,153 @@ class TorrentHandleWrapper(TorrentCallBack, Utils):
             ok=(name != "Unknown"),
         )
 
+    def file_index(self, path):
+        """Get index of a file in the torrent
+
+        Args:
+            path (str): file path relative to save_dir
+
+        Returns:
+            int: file index, None if not found or metadata is missing
+        """
+
+        if self.file_indices is None:
+            torrent_info = self.handle.torrent_file()
+            if torrent_info is None:
+                return None
+
+            files = torrent_info.files()
+            self.file_indices = {
+                files.file_path(i): i for i in range(files.num_files())
+            }
+
+        return self.file_indices.get(path)
+
+    def files(self):
+        """Get files of the torrent with their priority and progress
+
+        Returns:
+            list: file dicts, empty if metadata is missing
+        """
+
+        torrent_info = self.handle.torrent_file()
+        if torrent_info is None:
+            return []
+
+        files = torrent_info.files()
+        priorities = self.handle.file_priorities()
+        progress = self.handle.file_progress(flags=self.handle.piece_granularity)
+
+        return [
+            {
+                "index": i,
+                "path": files.file_path(i),
+                "size": files.file_size(i),
+                "priority": priorities[i],
+                "downloaded_bytes": progress[i],
+            }
+            for i in range(files.num_files())
+        ]
+
+    def set_file_priorities(self, user_id, priorities=None):
+        """Set file priorities wanted by a user
+
+        A torrent shared by several users downloads every file wanted by any
+        of them, so each file gets the highest priority set by its users and
+        users without a selection want all files.
+
+        Args:
+            user_id (str): user id
+            priorities (list, optional): priority per file, 0 to skip a file,
+                None for default priorities. Defaults to None.
+        """
+
+        if priorities:
+            self.file_priorities[user_id] = list(priorities)
+        else:
+            self.file_priorities.pop(user_id, None)
+
+        selections = [self.file_priorities.get(user) for user in self.save_dirs]
+        if not selections or not all(selections):
+            priorities = [4] * len(self.handle.file_priorities())
+        else:
+            priorities = [
+                max(selection[i] for selection in selections)
+                for i in range(len(selections[0]))
+            ]
+        self.handle.prioritize_files(priorities)
+        # File priorities reset piece priorities set for preview
+        self.preview_applied = False
+
+        # Totals change with the selection, push fresh status to all users
+        self.pending.update(self.callbacks)
+
+    def set_preview(self, user_id, preview=False):
+        """Set if a user wants preview, a torrent shared by several users is
+        previewed while any of them wants it
+
+        Args:
+            user_id (str): user id
+            preview (bool, optional): prioritise first and last pieces of
+                video files. Defaults to False.
+        """
+
+        if preview:
+            self.previews.add(user_id)
+            # Applied priorities are kept until handle_preview restores them
+            self.preview_applied = False
+        else:
+            self.previews.discard(user_id)
+
+        self.preview = any(user in self.previews for user in self.save_dirs)
+
+    def piece_range(self, file_index, start, length):
+        """Get pieces holding a byte range of a file
+
+        Args:
+            file_index (int): file index in the torrent
+            start (int): first byte of the range in the file
+            length (int): length of the range
+
+        Returns:
+            range: piece indices
+        """
+
+        torrent_info = self.handle.torrent_file()
+        files = torrent_info.files()
+        end = min(start + length, files.file_size(file_index)) - 1
+        if end < start:
+            return range(0)
+
+        offset = files.file_offset(file_index)
+        piece_length = torrent_info.piece_length()
+        return range(
+            (offset + start) // piece_length, (offset + end) // piece_length + 1
+        )
+
+    def available_length(self, file_index, start, length):
+        """Get how many bytes of a range of a file are downloaded, counting
+        from the start of the range up to the first missing piece
+
+        Args:
+            file_index (int): file index in the torrent
+            start (int): first byte of the range in the file
+            length (int): length of the range
+
+        Returns:
+            int: bytes readable from start
+        """
+
+        torrent_info = self.handle.torrent_file()
+        files = torrent_info.files()
+        end = min(start + length, files.file_size(file_index))
+        offset = files.file_offset(file_index) + start
+        for piece in self.piece_range(file_index, start, length):
+            if not self.handle.have_piece(piece):
+                return max(piece * torrent_info.piece_length() - offset, 0)
+
+        return max(end - start, 0)
+
     def stop(self):
         """Stop torrent download
 
@@ -118,10 +311,54 @@ class TorrentHandleWrapper(TorrentCallBack, Utils):
             bool: True if stopped
         """
 
-        self.stop_callback()
-        time.sleep(max((self.callback_interval or 1), 1))
+        self.remove_callback()
         self.session._stop(self.info_hash)
 
+    def unsubscribe(self, user_id):
+        """Remove a user from the torrent, the torrent is stopped once no user
+        is left. If the torrent is stored in the user's directory, storage is
+        handed over to the next subscribed user.
+
+        Args:
+            user_id (str): user to unsubscribe
+        """
+
+        self.remove_callback(user_id)
+        save_dir = self.save_dirs.pop(user_id, None)
+        self.session.queue_dirty = True
+        self.session.bandwidth_dirty = True
+
+        if not self.callbacks:
+            self.stop()
+            return
+
+        if user_id in self.file_priorities:
+            self.set_file_priorities(user_id)
+
+        if user_id in self.previews:
+            self.set_preview(user_id)
+
+        if save_dir == self.save_dir and self.save_dirs:
+            self.move_storage(next(iter(self.save_dirs.values())))
+
+    def move_storage(self, save_dir, timeout=30):
+        """Move downloaded files to save_dir and wait for the move to finish
+
+        Args:
+            save_dir (str): new download path
+            timeout (int, optional): max seconds to wait. Defaults to 30.
+        """
+
+        self.handle.move_storage(save_dir)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            status = self.handle.status(lt.torrent_handle.query_save_path)
+            if os.path.realpath(status.save_path) == save_dir:
+                break
+            time.sleep(0.1)
+
+        self.save_dir = save_dir
+
     def start(self):
         """Start torrent download
 
@@ -130,7 +367,6 @@ class TorrentHandleWrapper(TorrentCallBack, Utils):
         """
 
         self.handle = self.session._restart(self.magnet, self.save_dir, self.sequential)
-        # self.start_callback()
 
         if self.info_hash not in self.session.handles:
             self.session.handles[self.info_hash] = self
@@ -97,3 +97,27 @@ class MagnetUtils:
         torrent_info = lt.torrent_info(torrent_file)
         magnet = lt.make_magnet_uri(torrent_info)
         return magnet
+
+    def _get_torrent_info(self, data):
+        """Get torrent_info from the content of a torrent file
+
+        Args:
+            data (bytes): bencoded torrent file
+
+        Returns:
+            lt.torrent_info: torrent_info
+        """
+
+        return lt.torrent_info(lt.bdecode(data))
+
+    def _get_magnet_from_torrent_info(self, torrent_info):
+        """Get magnet uri from torrent_info
+
+        Args:
+            torrent_info (lt.torrent_info): torrent_info
+
+        Returns:
+            str: magnet uri
+        """
+
+        return lt.make_magnet_uri(torrent_info)
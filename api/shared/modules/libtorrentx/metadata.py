@@ -0,0 +1,76 @@
+import os
+import traceback
+import libtorrent as lt
+
+
+class MetadataCache:
+    def __init__(self, metadata_dir=None):
+        self.metadata_dir = metadata_dir
+
+        if self.metadata_dir:
+            os.makedirs(self.metadata_dir, exist_ok=True)
+
+    def _metadata_path(self, info_hash):
+        return os.path.join(self.metadata_dir, f"{info_hash}.torrent")
+
+    def _load_metadata(self, info_hash):
+        """Load cached metadata of info_hash
+
+        Args:
+            info_hash (str): info_hash
+
+        Returns:
+            lt.torrent_info: torrent_info, None if not cached
+        """
+
+        if not self.metadata_dir:
+            return None
+
+        path = self._metadata_path(info_hash)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                torrent_info = lt.torrent_info(lt.bdecode(f.read()))
+        except Exception:
+            traceback.print_exc()
+            return None
+
+        # Metadata is addressed by content, never trust a mismatching file
+        if str(torrent_info.info_hash()).lower() != info_hash:
+            return None
+
+        return torrent_info
+
+    def _save_metadata(self, torrent_info):
+        """Cache the info dict of torrent_info as a .torrent file
+
+        Args:
+            torrent_info (lt.torrent_info): torrent_info
+        """
+
+        if not self.metadata_dir or torrent_info is None:
+            return
+
+        info_hash = str(torrent_info.info_hash()).lower()
+        path = self._metadata_path(info_hash)
+        if os.path.exists(path):
+            return
+
+        # info_section() replaced metadata() in libtorrent 2.0
+        info = (
+            torrent_info.info_section()
+            if hasattr(torrent_info, "info_section")
+            else torrent_info.metadata()
+        )
+
+        try:
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(b"d4:info" + bytes(info) + b"e")
+            os.replace(f"{path}.tmp", path)
+        except Exception:
+            traceback.print_exc()
+
+    def on_metadata_received(self, alert):
+        self._save_metadata(alert.handle.torrent_file())
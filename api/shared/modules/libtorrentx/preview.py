@@ -0,0 +1,124 @@
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov", ".webm", ".m4v", ".wmv", ".ts")
+
+
+class PreviewMode:
+    def __init__(self, preview_bytes=4 * 1024 * 1024, window=16 * 1024 * 1024):
+        self.preview_bytes = preview_bytes
+        self.sequential_window = window
+
+    def set_preview(self, info_hash, preview=True, sequential_file=None, user_id=None):
+        """Download the start and end of video files first, so players can
+        read container headers and indexes before the rest arrives
+
+        Args:
+            info_hash (str): info_hash
+            preview (bool, optional): prioritise first and last pieces of
+                video files for user_id, normal priorities are restored once
+                no user of the torrent wants it. Defaults to True.
+            sequential_file (int, optional): index of a single file to download
+                in order, the rest of the torrent is not sequential. Defaults to None.
+            user_id (str, optional): user setting preview. Defaults to None.
+
+        Returns:
+            bool: True if the torrent is active
+        """
+
+        handle = self.handles.get(info_hash)
+        if handle is None:
+            return False
+
+        handle.set_preview(user_id, preview)
+        if sequential_file is not None:
+            handle.sequential_file = sequential_file
+            handle.sequential_cursor = None
+        return True
+
+    def apply_preview(self, handle):
+        """Set top priority on the pieces at both ends of wanted video files
+
+        Args:
+            handle (TorrentHandleWrapper): torrent with metadata
+        """
+
+        torrent_info = handle.handle.torrent_file()
+        files = torrent_info.files()
+        priorities = handle.handle.file_priorities()
+
+        for i in range(files.num_files()):
+            if not priorities[i]:
+                continue
+            if not files.file_path(i).lower().endswith(VIDEO_EXTENSIONS):
+                continue
+
+            size = files.file_size(i)
+            length = min(self.preview_bytes, size)
+            for start in (0, max(size - length, 0)):
+                for piece in handle.piece_range(i, start, length):
+                    handle.handle.piece_priority(piece, 7)
+
+    def clear_preview(self, handle):
+        """Restore piece priorities of a torrent to its file priorities
+
+        Args:
+            handle (TorrentHandleWrapper): torrent with metadata
+        """
+
+        handle.handle.prioritize_files(handle.handle.file_priorities())
+
+    def update_sequential_window(self, handle):
+        """Request the next missing pieces of the sequential file in order,
+        as a window of deadlines moving forward with the download
+
+        Args:
+            handle (TorrentHandleWrapper): torrent with metadata
+        """
+
+        files = handle.handle.torrent_file().files()
+        if handle.sequential_file >= files.num_files():
+            handle.sequential_file = None
+            return
+
+        pieces = handle.piece_range(
+            handle.sequential_file, 0, files.file_size(handle.sequential_file)
+        )
+        cursor = handle.sequential_cursor or pieces.start
+        while cursor < pieces.stop and handle.handle.have_piece(cursor):
+            cursor += 1
+        handle.sequential_cursor = cursor
+
+        if cursor >= pieces.stop:
+            handle.sequential_file = None
+            return
+
+        piece_length = handle.handle.torrent_file().piece_length()
+        window = handle.piece_range(
+            handle.sequential_file,
+            max(cursor * piece_length - files.file_offset(handle.sequential_file), 0),
+            self.sequential_window,
+        )
+        # Later deadlines than streaming, so a playing stream comes first
+        for i, piece in enumerate(window):
+            if not handle.handle.have_piece(piece):
+                handle.handle.set_piece_deadline(piece, 5000 * (i + 1))
+
+    def handle_preview(self):
+        """Apply or restore preview priorities once metadata is available and
+        move the sequential window of torrents downloading a file in order"""
+        for handle in list(self.handles.values()):
+            if (
+                handle.preview == handle.preview_applied
+                and handle.sequential_file is None
+            ):
+                continue
+            if handle.handle.torrent_file() is None:
+                continue
+
+            if handle.preview and not handle.preview_applied:
+                self.apply_preview(handle)
+                handle.preview_applied = True
+            elif not handle.preview and handle.preview_applied:
+                self.clear_preview(handle)
+                handle.preview_applied = False
+
+            if handle.sequential_file is not None:
+                self.update_sequential_window(handle)
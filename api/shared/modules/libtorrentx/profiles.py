@@ -0,0 +1,141 @@
+import os
+import libtorrent as lt
+
+# Only alerts the engine handles: status updates, add/remove, metadata,
+# resume data, storage moves and finished pieces for streaming
+ALERT_MASK = (
+    lt.alert.category_t.status_notification
+    | lt.alert.category_t.error_notification
+    | lt.alert.category_t.storage_notification
+    | lt.alert.category_t.piece_progress_notification
+)
+
+# Optional torrent_status fields used by TorrentProps, the others are not
+# computed when status is requested
+STATUS_FLAGS = lt.torrent_handle.query_name | lt.torrent_handle.query_save_path
+
+PROFILES = {
+    "low-memory": {
+        "connections_limit": 100,
+        "aio_threads": 2,
+        "hashing_threads": 1,
+        "max_queued_disk_bytes": 1024 * 1024,
+        "send_buffer_watermark": 128 * 1024,
+        "send_buffer_low_watermark": 32 * 1024,
+        "max_peerlist_size": 1000,
+        "cache_size": 256,  # 16 KiB blocks, ignored by libtorrent 2.0
+    },
+    "balanced": {
+        "connections_limit": 500,
+        "aio_threads": 4,
+        "hashing_threads": 2,
+        "max_queued_disk_bytes": 4 * 1024 * 1024,
+        "send_buffer_watermark": 512 * 1024,
+        "send_buffer_low_watermark": 128 * 1024,
+        "max_peerlist_size": 3000,
+        "cache_size": 2048,
+    },
+    "high-throughput": {
+        "connections_limit": 2000,
+        "aio_threads": 16,
+        "hashing_threads": 8,
+        "max_queued_disk_bytes": 64 * 1024 * 1024,
+        "send_buffer_watermark": 4 * 1024 * 1024,
+        "send_buffer_low_watermark": 1024 * 1024,
+        "max_peerlist_size": 10000,
+        "cache_size": 32768,
+    },
+}
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def get_resource_limits():
+    """Get memory and CPUs available to the process, honouring cgroup v1/v2
+    limits of the container
+
+    Returns:
+        tuple: memory in bytes, number of cpus
+    """
+
+    memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    limit = _read("/sys/fs/cgroup/memory.max") or _read(
+        "/sys/fs/cgroup/memory/memory.limit_in_bytes"
+    )
+    if limit and limit.isdigit():
+        memory = min(memory, int(limit))
+
+    cpus = os.cpu_count() or 1
+    quota = _read("/sys/fs/cgroup/cpu.max")
+    if quota:
+        quota, period = (quota.split() + ["100000"])[:2]
+    else:
+        quota = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+        period = _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and quota.lstrip("-").isdigit() and int(quota) > 0:
+        cpus = min(cpus, max(int(quota) // int(period), 1))
+
+    return memory, cpus
+
+
+def get_profile_settings(profile="auto"):
+    """Get libtorrent settings of a named profile
+
+    The auto profile picks a profile from the memory and CPUs of the
+    container. Thread counts and the disk queue are always capped to the
+    resources actually available.
+
+    Args:
+        profile (str, optional): auto, low-memory, balanced or high-throughput.
+            Defaults to "auto".
+
+    Raises:
+        ValueError: unknown profile
+
+    Returns:
+        dict: libtorrent settings
+    """
+
+    memory, cpus = get_resource_limits()
+
+    if profile == "auto":
+        if memory < 1024**3 or cpus < 2:
+            profile = "low-memory"
+        elif memory >= 8 * 1024**3 and cpus >= 8:
+            profile = "high-throughput"
+        else:
+            profile = "balanced"
+
+    if profile not in PROFILES:
+        raise ValueError(f"unknown torrent profile {profile}")
+
+    settings = dict(PROFILES[profile])
+    settings["aio_threads"] = max(min(settings["aio_threads"], cpus * 2), 1)
+    settings["hashing_threads"] = max(min(settings["hashing_threads"], cpus), 1)
+    settings["max_queued_disk_bytes"] = max(
+        min(settings["max_queued_disk_bytes"], memory // 64), 256 * 1024
+    )
+    settings["alert_mask"] = ALERT_MASK
+
+    return settings
+
+
+def apply_settings(session, settings):
+    """Apply settings to a libtorrent session, older bindings only have
+    set_settings
+
+    Args:
+        session (lt.session): session
+        settings (dict): libtorrent settings
+    """
+
+    if hasattr(session, "apply_settings"):
+        session.apply_settings(settings)
+    else:
+        session.set_settings(settings)
@@ -0,0 +1,156 @@
+from .profiles import STATUS_FLAGS
+
+QUEUE_ACTIONS = ("top", "up", "down", "bottom")
+
+
+class TorrentQueue:
+    def __init__(self, active_downloads=None, active_seeds=None, active_limit=None):
+        self.queue_limits = {
+            key: value
+            for key, value in {
+                "active_downloads": active_downloads,
+                "active_seeds": active_seeds,
+                "active_limit": active_limit,
+            }.items()
+            if value is not None
+        }
+        self.queue_dirty = False
+        # Rebalance in which each user last had a torrent in an active slot
+        self.served_at = {}
+        self.rebalances = 0
+
+    def _queue_order(self):
+        """Get downloading torrents ordered by queue position, finished
+        torrents are not queued by libtorrent"""
+        queue = [
+            (handle.handle.queue_position(), handle)
+            for handle in list(self.handles.values())
+        ]
+        return [
+            handle
+            for position, handle in sorted(queue, key=lambda item: item[0])
+            if position >= 0
+        ]
+
+    def get_queue(self, user_id=None):
+        """Get queued torrents and the limits of the queue
+
+        Args:
+            user_id (str, optional): only torrents of this user. Defaults to None.
+
+        Returns:
+            dict: queue limits and torrents ordered by queue position
+        """
+
+        torrents = []
+        for handle in self._queue_order():
+            if user_id is not None and user_id not in handle.save_dirs:
+                continue
+
+            status = handle.handle.status(STATUS_FLAGS)
+            torrents.append(
+                {
+                    "info_hash": handle.info_hash,
+                    "name": status.name or "Unknown",
+                    "queue_position": status.queue_position,
+                    "is_queued": bool(status.paused and status.auto_managed),
+                }
+            )
+
+        return {**self.queue_limits, "torrents": torrents}
+
+    def move_in_queue(self, info_hash, user_id, action):
+        """Move a torrent of a user relative to the user's other torrents
+
+        Args:
+            info_hash (str): info_hash
+            user_id (str): user id
+            action (str): top, up, down or bottom
+
+        Returns:
+            bool: True if the torrent is queued for the user
+        """
+
+        if action not in QUEUE_ACTIONS:
+            raise ValueError(f"unknown queue action {action}")
+
+        with self.lock:
+            queue = [h for h in self._queue_order() if user_id in h.save_dirs]
+            handle = self.handles.get(info_hash)
+            if handle not in queue:
+                return False
+
+            index = queue.index(handle)
+            queue.remove(handle)
+            index = {
+                "top": 0,
+                "up": max(index - 1, 0),
+                "down": index + 1,
+                "bottom": len(queue),
+            }[action]
+            queue.insert(index, handle)
+
+            self.rebalance_queue({user_id: queue})
+            return True
+
+    def rebalance_queue(self, orders=None):
+        """Interleave torrents of all users round robin, so a user adding many
+        torrents does not hold back the torrents of others. Each user's own
+        torrents keep their relative order. Torrents already downloading keep
+        their place, turns over the waiting ones start with the users who
+        waited longest for an active download slot.
+
+        Args:
+            orders (dict, optional): torrent order per user_id, overriding
+                their current queue order, downloading torrents included.
+                Defaults to None.
+        """
+
+        with self.lock:
+            queue = self._queue_order()
+
+            # Restarting downloads on every add or stop would only slow them
+            # down, explicit moves may reorder them
+            active = []
+            if orders is None:
+                active = [h for h in queue if not h.handle.status(0).paused]
+
+            self.rebalances += 1
+            self.served_at = {
+                user_id: self.served_at[user_id]
+                for handle in queue
+                for user_id in handle.save_dirs
+                if user_id in self.served_at
+            }
+            for handle in active:
+                for user_id in handle.save_dirs:
+                    self.served_at[user_id] = self.rebalances
+
+            orders = dict(orders or {})
+            for handle in queue:
+                if handle in active:
+                    continue
+                for user_id in handle.save_dirs:
+                    orders.setdefault(user_id, [])
+                    if handle not in orders[user_id]:
+                        orders[user_id].append(handle)
+
+            # Torrents shared by several users take their best position
+            users = sorted(orders, key=lambda u: (self.served_at.get(u, 0), u))
+            order = list(active)
+            for i in range(max([len(o) for o in orders.values()] or [0])):
+                for user_orders in [orders[user_id] for user_id in users]:
+                    if i < len(user_orders) and user_orders[i] not in order:
+                        order.append(user_orders[i])
+
+            if order == queue:
+                return
+
+            for handle in order:
+                handle.handle.queue_position_bottom()
+
+    def handle_queue(self):
+        """Rebalance the queue after torrents were added or removed"""
+        if self.queue_dirty:
+            self.queue_dirty = False
+            self.rebalance_queue()
@@ -0,0 +1,148 @@
+import os
+import time
+import traceback
+import libtorrent as lt
+
+
+class ResumeData:
+    def __init__(self, resume_dir=None, resume_interval=300):
+        self.resume_dir = resume_dir
+        self.resume_interval = resume_interval
+        self.resume_saved_at = time.time()
+        self.resume_outstanding = 0
+        self.removing = {}
+
+        if self.resume_dir:
+            os.makedirs(self.resume_dir, exist_ok=True)
+
+    def _resume_data_path(self, info_hash):
+        return os.path.join(self.resume_dir, f"{info_hash}.fastresume")
+
+    def _load_resume_data(self, info_hash, save_dir):
+        """Load fast resume data saved for info_hash
+
+        Resume data is only used if it was saved for the same save_dir and
+        the directory still exists, otherwise libtorrent would trust pieces
+        which are not on disk.
+
+        Args:
+            info_hash (str): info_hash
+            save_dir (str): download path
+
+        Returns:
+            lt.add_torrent_params: params to add torrent with, None if unavailable
+        """
+
+        if not self.resume_dir or not os.path.isdir(save_dir):
+            return None
+
+        path = self._resume_data_path(info_hash)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                params = lt.read_resume_data(f.read())
+        except Exception:
+            traceback.print_exc()
+            return None
+
+        if os.path.realpath(params.save_path) != os.path.realpath(save_dir):
+            return None
+
+        return params
+
+    def has_resume_data(self, info_hash):
+        """Check if fast resume data was saved for info_hash
+
+        Args:
+            info_hash (str): info_hash
+
+        Returns:
+            bool: True if saved
+        """
+
+        return bool(self.resume_dir) and os.path.exists(
+            self._resume_data_path(info_hash)
+        )
+
+    def discard_resume_data(self, info_hash):
+        """Delete fast resume data of info_hash
+
+        Args:
+            info_hash (str): info_hash
+        """
+
+        if self.has_resume_data(info_hash):
+            os.remove(self._resume_data_path(info_hash))
+
+    def save_resume_data(self, handle):
+        """Request fast resume data of a torrent, written by on_save_resume_data
+
+        Args:
+            handle (lt.torrent_handle): torrent_handle
+        """
+
+        if not self.resume_dir:
+            return False
+
+        handle.save_resume_data(
+            lt.save_resume_flags_t.flush_disk_cache
+            | lt.save_resume_flags_t.save_info_dict
+            | lt.save_resume_flags_t.only_if_modified
+        )
+        self.resume_outstanding += 1
+        return True
+
+    def handle_resume_data(self):
+        """Periodically request resume data of all torrents in the session"""
+        if time.time() - self.resume_saved_at < self.resume_interval:
+            return
+
+        self.resume_saved_at = time.time()
+        for handle in list(self.handles.values()):
+            self.save_resume_data(handle.handle)
+
+    def flush_resume_data(self, timeout=10):
+        """Request resume data of all torrents and wait until it is written,
+        used on shutdown while the status pump is stopped
+
+        Args:
+            timeout (int, optional): max seconds to wait. Defaults to 10.
+        """
+
+        for handle in list(self.handles.values()):
+            self.save_resume_data(handle.handle)
+
+        deadline = time.time() + timeout
+        while self.resume_outstanding > 0 and time.time() < deadline:
+            self.session.wait_for_alert(500)
+            for alert in self.session.pop_alerts():
+                if alert.what() == "save_resume_data":
+                    self.on_save_resume_data(alert)
+                elif alert.what() == "save_resume_data_failed":
+                    self.on_save_resume_data_failed(alert)
+
+    def on_save_resume_data(self, alert):
+        self.resume_outstanding = max(self.resume_outstanding - 1, 0)
+        info_hash = str(alert.handle.info_hash()).lower()
+
+        try:
+            path = self._resume_data_path(info_hash)
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(lt.write_resume_data_buf(alert.params))
+            os.replace(f"{path}.tmp", path)
+        except Exception:
+            traceback.print_exc()
+
+        self._remove_stopped(info_hash)
+
+    def on_save_resume_data_failed(self, alert):
+        # only_if_modified reports unchanged torrents as failed, nothing to write
+        self.resume_outstanding = max(self.resume_outstanding - 1, 0)
+        self._remove_stopped(str(alert.handle.info_hash()).lower())
+
+    def _remove_stopped(self, info_hash):
+        handle = self.removing.pop(info_hash, None)
+        if handle is not None:
+            self._remove_torrent(info_hash, handle)
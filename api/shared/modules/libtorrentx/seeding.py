@@ -0,0 +1,88 @@
+import time
+import libtorrent as lt
+
+
+class SeedingPolicy:
+    def __init__(
+        self,
+        max_ratio=0,
+        max_seed_time=0,
+        seed_while_idle=False,
+        seeding_interval=60,
+    ):
+        self.max_ratio = max_ratio
+        self.max_seed_time = max_seed_time
+        self.seed_while_idle = seed_while_idle
+        self.seeding_interval = seeding_interval
+        self.seeding_checked_at = 0
+        self.idle_paused = set()
+
+    def _seeding_done(self, status):
+        """Check if a finished torrent reached the ratio or seed time limit
+
+        Args:
+            status (lt.torrent_status): status of the torrent
+
+        Returns:
+            bool: True if the torrent should stop seeding
+        """
+
+        if self.max_ratio and status.all_time_upload >= self.max_ratio * max(
+            status.total_wanted, 1
+        ):
+            return True
+
+        # seeding_duration replaced seeding_time in libtorrent 2.0
+        seed_time = getattr(status, "seeding_duration", None)
+        if seed_time is None:
+            seed_time = status.seeding_time
+        if hasattr(seed_time, "total_seconds"):
+            seed_time = seed_time.total_seconds()
+
+        return bool(self.max_seed_time and seed_time >= self.max_seed_time)
+
+    def _pause_seeding(self, handle):
+        # Unmanaged, so the queue does not start the torrent again
+        handle.handle.unset_flags(lt.torrent_flags.auto_managed)
+        handle.handle.pause()
+
+    def handle_seeding(self):
+        """Stop seeding torrents which reached their ratio or seed time limit,
+        and pause seeding while other torrents are downloading if configured"""
+        if not (self.max_ratio or self.max_seed_time or self.seed_while_idle):
+            return
+        if time.time() - self.seeding_checked_at < self.seeding_interval:
+            return
+
+        self.seeding_checked_at = time.time()
+
+        with self.lock:
+            torrents = [
+                (handle, handle.handle.status(0))
+                for handle in list(self.handles.values())
+            ]
+            downloading = any(
+                not status.is_finished and not status.paused
+                for handle, status in torrents
+            )
+
+            for handle, status in torrents:
+                if not status.is_finished:
+                    continue
+
+                if self._seeding_done(status):
+                    if not status.paused or status.auto_managed:
+                        self._pause_seeding(handle)
+                    self.idle_paused.discard(handle.info_hash)
+
+                elif handle.info_hash in self.idle_paused:
+                    if not downloading:
+                        handle.handle.set_flags(lt.torrent_flags.auto_managed)
+                        handle.handle.resume()
+                        self.idle_paused.discard(handle.info_hash)
+
+                elif self.seed_while_idle and downloading and not status.paused:
+                    self._pause_seeding(handle)
+                    self.idle_paused.add(handle.info_hash)
+
+            self.idle_paused.intersection_update(self.handles)
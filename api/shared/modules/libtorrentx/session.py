@@ -1,37 +1,116 @@
 import os
 import re
+import threading
 import libtorrent as lt
 from .magnet import MagnetUtils
 from .handle import TorrentHandleWrapper
-
-
-class LibTorrentSession(MagnetUtils):
-    def __init__(self, redis=None):
-        super(LibTorrentSession, self).__init__()
-        self.session = lt.session()
-        self.redis = redis
+from .callback import SessionCallBack
+from .resume import ResumeData
+from .metadata import MetadataCache
+from .stream import PieceStreaming
+from .state import SessionState
+from .queue import TorrentQueue
+from .bandwidth import BandwidthLimits
+from .seeding import SeedingPolicy
+from .preview import PreviewMode
+from .store import ContentStore
+from .profiles import apply_settings, get_profile_settings
+
+
+class LibTorrentSession(
+    MagnetUtils,
+    SessionCallBack,
+    ResumeData,
+    MetadataCache,
+    PieceStreaming,
+    SessionState,
+    TorrentQueue,
+    BandwidthLimits,
+    SeedingPolicy,
+    PreviewMode,
+    ContentStore,
+):
+    def __init__(
+        self,
+        pump_interval=1,
+        resume_dir=None,
+        metadata_dir=None,
+        state_file=None,
+        store_dir=None,
+        profile="balanced",
+        active_downloads=None,
+        active_seeds=None,
+        active_limit=None,
+        download_limit=0,
+        upload_limit=0,
+        user_download_limit=0,
+        user_upload_limit=0,
+        max_ratio=0,
+        max_seed_time=0,
+        seed_while_idle=False,
+    ):
+        SessionCallBack.__init__(self, pump_interval=pump_interval)
+        ResumeData.__init__(self, resume_dir=resume_dir)
+        MetadataCache.__init__(self, metadata_dir=metadata_dir)
+        ContentStore.__init__(self, store_dir=store_dir)
+        PieceStreaming.__init__(self)
+        PreviewMode.__init__(self)
+        SessionState.__init__(self, state_file=state_file)
+        TorrentQueue.__init__(
+            self,
+            active_downloads=active_downloads,
+            active_seeds=active_seeds,
+            active_limit=active_limit,
+        )
+        BandwidthLimits.__init__(
+            self,
+            user_download_limit=user_download_limit,
+            user_upload_limit=user_upload_limit,
+        )
+        SeedingPolicy.__init__(
+            self,
+            max_ratio=max_ratio,
+            max_seed_time=max_seed_time,
+            seed_while_idle=seed_while_idle,
+        )
+        self.session = self._create_session()
 
         settings = self.session.get_settings()
         settings.update(
             {
-                "alert_mask": lt.alert.category_t.all_categories,
-                "connections_limit": 500,
                 "enable_outgoing_utp": False,
                 "enable_incoming_utp": False,
             }
         )
 
-        (
-            self.session.apply_settings(settings)
-            if hasattr(self.session, "apply_settings")
-            else self.session.set_settings(settings)
+        # Settings unknown to the installed libtorrent version are skipped
+        settings.update(
+            {
+                key: value
+                for key, value in get_profile_settings(profile).items()
+                if key in settings
+            }
+        )
+
+        # Auto managed torrents beyond these limits wait in the queue
+        settings.update(self.queue_limits)
+        settings.update(
+            {"download_rate_limit": download_limit, "upload_rate_limit": upload_limit}
         )
 
+        apply_settings(self.session, settings)
+
         self.handles = {}
+        self.torrent_handles = {}
+        self.lock = threading.RLock()
+        self.start_pump()
 
     def _get_torrent_handle(self, info_hash):
         """Get torrent_handle from info_hash
 
+        Handles are indexed by info_hash as torrents are added and removed,
+        the session is only asked with find_torrent on an index miss.
+
         Args:
             info_hash (str): info_hash
 
@@ -39,12 +118,45 @@ class LibTorrentSession(MagnetUtils):
             lt.torrent_handle: torrent_handle
         """
 
-        for torrent_handle in self.session.get_torrents():
-            if (
-                str(torrent_handle.info_hash()).strip().lower()
-                == info_hash.strip().lower()
-            ):
-                return torrent_handle
+        info_hash = info_hash.strip().lower()
+        torrent_handle = self.torrent_handles.get(info_hash)
+        if torrent_handle is not None and torrent_handle.is_valid():
+            return torrent_handle
+
+        try:
+            torrent_handle = self.session.find_torrent(
+                lt.sha1_hash(bytes.fromhex(info_hash))
+            )
+        except ValueError:
+            return None
+
+        if not torrent_handle.is_valid():
+            self.torrent_handles.pop(info_hash, None)
+            return None
+
+        self.torrent_handles[info_hash] = torrent_handle
+        return torrent_handle
+
+    def _remove_torrent(self, info_hash, handle):
+        self.torrent_handles.pop(info_hash, None)
+        self.session.remove_torrent(handle)
+
+    def on_add_torrent(self, alert):
+        if not alert.error.value():
+            info_hash = str(alert.handle.info_hash()).lower()
+            self.torrent_handles[info_hash] = alert.handle
+
+    def on_metadata_received(self, alert):
+        MetadataCache.on_metadata_received(self, alert)
+
+        # Files users downloaded before the store was used are adopted before
+        # the next link pass, which would otherwise keep them as they are
+        handle = self.handles.get(str(alert.handle.info_hash()).lower())
+        if handle is not None and self.store_dir:
+            self.adopt_user_content(handle)
+
+    def on_torrent_removed(self, alert):
+        self.torrent_handles.pop(str(alert.info_hash).lower(), None)
 
     def _exist(self, info_hash):
         """Check if torrent exist in session
@@ -74,7 +186,7 @@ class LibTorrentSession(MagnetUtils):
             return info_hash
 
         elif isinstance(magnet, lt.torrent_handle):
-            return str(magnet.status().info_hash).lower()
+            return str(magnet.info_hash()).lower()
 
     def _stop(self, handle):
         """Stop torrent
@@ -86,16 +198,77 @@ class LibTorrentSession(MagnetUtils):
             bool: True if stopped
         """
 
-        if isinstance(handle, str) and self._exist(handle):
-            self.session.remove_torrent(self._get_torrent_handle(handle))
-            del self.handles[handle]
-            return True
-        elif isinstance(handle, lt.torrent_handle):
-            info_hash = self._get_info_hash(handle)
-            self.session.remove_torrent(handle)
-            del self.handles[info_hash]
+        with self.lock:
+            if isinstance(handle, str):
+                info_hash = handle
+                handle = self._get_torrent_handle(info_hash)
+                if handle is None:
+                    return False
+            else:
+                info_hash = self._get_info_hash(handle)
+
+            self.handles.pop(info_hash, None)
+            self.queue_dirty = True
+            self.bandwidth_dirty = True
+
+            if self.resume_dir:
+                # Torrent is removed once its resume data is written
+                handle.unset_flags(lt.torrent_flags.auto_managed)
+                handle.pause()
+                self.save_resume_data(handle)
+                self.removing[info_hash] = handle
+            else:
+                self._remove_torrent(info_hash, handle)
+
             return True
 
+    def _add_magnet(self, magnet, save_dir, torrent_info=None):
+        """Add magnet to libtorrent session, using fast resume data or cached
+        metadata if available
+
+        Args:
+            magnet (str): magnet link
+            save_dir (str): download path
+            torrent_info (lt.torrent_info, optional): metadata of the torrent. Defaults to None.
+
+        Returns:
+            lt.torrent_handle: torrent_handle
+        """
+
+        info_hash = self._get_info_hash(magnet)
+
+        # Torrent is still waiting for its resume data to be written
+        if info_hash in self.removing:
+            handle = self.removing.pop(info_hash)
+            handle.set_flags(lt.torrent_flags.auto_managed)
+            handle.resume()
+            return handle
+
+        if torrent_info is not None:
+            self._save_metadata(torrent_info)
+
+        params = self._load_resume_data(info_hash, save_dir)
+        if params is not None:
+            # Resume data of stopped torrents is saved paused and unmanaged
+            params.flags |= lt.torrent_flags.auto_managed
+            params.flags &= ~lt.torrent_flags.paused
+        else:
+            params = lt.parse_magnet_uri(magnet)
+            params.save_path = save_dir
+
+            torrent_info = torrent_info or self._load_metadata(info_hash)
+            if torrent_info is not None:
+                params.ti = torrent_info
+
+                # Content downloaded before is seeded without rechecking
+                if self.is_complete(info_hash) and os.path.isdir(save_dir):
+                    params.flags |= lt.torrent_flags.seed_mode
+
+        os.makedirs(save_dir, exist_ok=True)
+        handle = self.session.add_torrent(params)
+        self.torrent_handles[info_hash] = handle
+        return handle
+
     def _restart(self, magnet, save_dir, sequential=False):
         """Add torrent to libtorrent session again
 
@@ -111,9 +284,8 @@ class LibTorrentSession(MagnetUtils):
         info_hash = self._get_info_hash(magnet)
         if os.path.basename(save_dir) != info_hash:
             save_dir = os.path.realpath(os.path.join(save_dir, info_hash))
-        os.makedirs(save_dir, exist_ok=True)
-
-        handle = lt.add_magnet_uri(self.session, magnet, {"save_path": save_dir})
+        with self.lock:
+            handle = self._add_magnet(magnet, save_dir)
         handle.set_sequential_download(sequential)
 
         return handle
@@ -124,54 +296,143 @@ class LibTorrentSession(MagnetUtils):
         save_dir,
         sequential=False,
         callback=None,
-        callback_interval=1,
         download_speed=0,
+        user_id=None,
     ):
         """Add magnet link or torrent file to libtorrent session
 
+        Torrents are registered by info_hash, adding an info_hash which is
+        already in the session returns the existing handle and records
+        save_dir for user_id, so a single download is shared by all users.
+        With a store_dir, torrents are downloaded to the store and their files
+        are hard linked into save_dir. Without one, they are downloaded to the
+        save_dir of their first user and linked from there.
+
         Args:
-            magnet (str): magnet link or torrent file
+            magnet (str or lt.torrent_info): magnet link, torrent file or torrent_info
             save_dir (str): download path
             sequential (bool, optional): download sequentially. Defaults to False.
             callback (function, optional): callback function. Defaults to None.
-            callback_interval (int, optional): callback interval. Defaults to 1.
             limit_download_speed (int, optional): limit download speed. Defaults to 0.
+            user_id (str, optional): user the torrent is added for. Defaults to None.
 
         Returns:
             TorrentHandleWrapper: TorrentHandleWrapper
         """
 
-        if magnet.strip().lower().endswith(".torrent"):
+        torrent_info = None
+        if isinstance(magnet, lt.torrent_info):
+            torrent_info = magnet
+        elif magnet.strip().lower().endswith(".torrent"):
             if not os.path.exists(magnet):
                 raise FileNotFoundError(f"{magnet} not found")
-            magnet = self._get_magnet_from_torrent_file(magnet)
+            torrent_info = lt.torrent_info(magnet)
+
+        if torrent_info is not None:
+            magnet = self._get_magnet_from_torrent_info(torrent_info)
 
         magnet = self._clean_magnet_uri(magnet)
         info_hash = self._get_info_hash(magnet)
 
-        if info_hash in self.handles and self._exist(info_hash):
-            return self.handles[info_hash]
-
         if os.path.basename(save_dir) != info_hash:
             save_dir = os.path.realpath(os.path.join(save_dir, info_hash))
-        os.makedirs(save_dir, exist_ok=True)
 
-        handle = lt.add_magnet_uri(self.session, magnet, {"save_path": save_dir})
+        with self.lock:
+            self.queue_dirty = True
+            self.bandwidth_dirty = True
+
+            if info_hash in self.handles and self._exist(info_hash):
+                self.handles[info_hash].save_dirs[user_id] = save_dir
+                self.link_content(self.handles[info_hash], user_id)
+                return self.handles[info_hash]
+
+            user_save_dir = save_dir
+            if self.store_dir:
+                self.adopt_content(
+                    info_hash, save_dir, torrent_info or self._load_metadata(info_hash)
+                )
+                save_dir = self._store_path(info_hash)
+
+            handle = self._add_magnet(magnet, save_dir, torrent_info)
+
+            if sequential:
+                handle.set_sequential_download(sequential)
+
+            if download_speed:
+                handle.set_download_limit(download_speed)  # B/s
+
+            self.handles[info_hash] = TorrentHandleWrapper(
+                session=self,
+                handle=handle,
+                magnet=magnet,
+                save_dir=save_dir,
+                sequential=sequential,
+                callback=callback,
+            )
+            self.handles[info_hash].save_dirs[user_id] = user_save_dir
+            self.link_content(self.handles[info_hash], user_id)
+
+            return self.handles[info_hash]
 
-        if sequential:
-            handle.set_sequential_download(sequential)
+    def get_files(self, info_hash):
+        """Get files of a torrent, from the session if the torrent is active
+        or from cached metadata otherwise
 
-        if download_speed:
-            handle.set_download_limit(download_speed)  # B/s
+        Args:
+            info_hash (str): info_hash
 
-        self.handles[info_hash] = TorrentHandleWrapper(
-            session=self,
-            handle=handle,
-            magnet=magnet,
-            save_dir=save_dir,
-            sequential=sequential,
-            callback=callback,
-            callback_interval=callback_interval,
-        )
+        Returns:
+            list: file dicts, None if metadata is not available
+        """
+
+        if info_hash in self.handles:
+            files = self.handles[info_hash].files()
+            if files:
+                return files
+
+        torrent_info = self._load_metadata(info_hash)
+        if torrent_info is None:
+            return None
+
+        files = torrent_info.files()
+        return [
+            {
+                "index": i,
+                "path": files.file_path(i),
+                "size": files.file_size(i),
+                "priority": None,
+                "downloaded_bytes": None,
+            }
+            for i in range(files.num_files())
+        ]
+
+    def set_file_priorities(self, info_hash, user_id, priorities):
+        """Set file priorities of a user for an active torrent
+
+        Args:
+            info_hash (str): info_hash
+            user_id (str): user id
+            priorities (list): priority per file, 0 to skip a file
+
+        Returns:
+            bool: True if the torrent is active for the user
+        """
+
+        handle = self.handles.get(info_hash)
+        if handle is None or user_id not in handle.save_dirs:
+            return False
+
+        handle.set_file_priorities(user_id, priorities)
+        return True
+
+    def shutdown(self):
+        """Stop the status pump, write resume data and session state and pause
+        the libtorrent session"""
 
-        return self.handles[info_hash]
+        self.stop_pump()
+        with self.lock:
+            for handle in list(self.handles.values()):
+                handle.remove_callback()
+            self.session.pause()
+            self.flush_resume_data()
+            self.save_session_state()
@@ -0,0 +1,65 @@
+import os
+import time
+import traceback
+import libtorrent as lt
+
+
+class SessionState:
+    def __init__(self, state_file=None, state_interval=900):
+        self.state_file = state_file
+        self.state_interval = state_interval
+        self.state_saved_at = time.time()
+
+    def _create_session(self):
+        """Create libtorrent session, restoring DHT routing table and settings
+        saved by a previous run if available
+
+        Returns:
+            lt.session: session
+        """
+
+        data = None
+        if self.state_file and os.path.exists(self.state_file):
+            with open(self.state_file, "rb") as f:
+                data = f.read()
+
+        # session_params replaced save_state/load_state in libtorrent 2.0
+        if data and hasattr(lt, "read_session_params"):
+            try:
+                return lt.session(lt.read_session_params(data))
+            except Exception:
+                traceback.print_exc()
+
+        session = lt.session()
+        if data and hasattr(session, "load_state"):
+            try:
+                session.load_state(lt.bdecode(data))
+            except Exception:
+                traceback.print_exc()
+
+        return session
+
+    def save_session_state(self):
+        """Write session state to state_file"""
+        if not self.state_file:
+            return
+
+        self.state_saved_at = time.time()
+
+        try:
+            if hasattr(lt, "write_session_params_buf"):
+                data = lt.write_session_params_buf(self.session.session_state())
+            else:
+                data = lt.bencode(self.session.save_state())
+
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            with open(f"{self.state_file}.tmp", "wb") as f:
+                f.write(data)
+            os.replace(f"{self.state_file}.tmp", self.state_file)
+        except Exception:
+            traceback.print_exc()
+
+    def handle_session_state(self):
+        """Periodically save session state, so a crash keeps recent DHT nodes"""
+        if time.time() - self.state_saved_at >= self.state_interval:
+            self.save_session_state()
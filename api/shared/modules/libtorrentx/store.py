@@ -0,0 +1,251 @@
+import errno
+import os
+import shutil
+import time
+import traceback
+
+
+class ContentStore:
+    def __init__(self, store_dir=None, link_interval=30, gc_interval=3600):
+        self.store_dir = store_dir
+        self.link_interval = link_interval
+        self.gc_interval = gc_interval
+        self.linked_at = time.time()
+        self.collected_at = time.time()
+        # Torrents whose content is on another file system than a user's
+        # directory, only linked (copied) once complete
+        self.cross_device = set()
+        # Set by the owner of the session to a function returning info_hashes
+        # users are subscribed to, their content is never collected
+        self.subscribed = None
+
+        if self.store_dir:
+            os.makedirs(self._complete_path(""), exist_ok=True)
+
+    def _store_path(self, info_hash):
+        return os.path.join(self.store_dir, info_hash)
+
+    def _complete_path(self, info_hash):
+        return os.path.join(self.store_dir, ".complete", info_hash)
+
+    def is_complete(self, info_hash):
+        """Check if every file of a torrent was downloaded to the store
+
+        Args:
+            info_hash (str): info_hash
+
+        Returns:
+            bool: True if complete
+        """
+
+        return bool(self.store_dir) and os.path.exists(self._complete_path(info_hash))
+
+    def _same_file(self, source, target):
+        """Check if target is source, or a copy of it on another file system"""
+        try:
+            s, t = os.stat(source), os.stat(target)
+        except OSError:
+            return False
+
+        if s.st_dev == t.st_dev:
+            return s.st_ino == t.st_ino
+        return s.st_size == t.st_size and s.st_mtime_ns == t.st_mtime_ns
+
+    def _link_file(self, source, target, copy=False, replace=False):
+        """Hard link source to target, files of torrents are written in place
+        so links of partially downloaded files fill up as pieces arrive
+
+        Args:
+            source (str): file in the store
+            target (str): file in a user's directory
+            copy (bool, optional): copy if source and target are on different
+                file systems. Defaults to False.
+            replace (bool, optional): replace a target which is another file,
+                e.g. a stale partial download. Defaults to False.
+
+        Returns:
+            bool: True if target was linked
+        """
+
+        if not os.path.exists(source):
+            return False
+        if os.path.lexists(target) and (
+            not replace or self._same_file(source, target)
+        ):
+            return False
+
+        # Linked next to target first, so target is only replaced by a link
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp = f"{target}.link"
+        if os.path.lexists(temp):
+            os.remove(temp)
+        try:
+            os.link(source, temp)
+        except OSError as e:
+            if e.errno != errno.EXDEV or not copy:
+                raise
+            shutil.copy2(source, temp)
+        os.replace(temp, target)
+        return True
+
+    def _files(self, handle):
+        torrent_info = handle.handle.torrent_file()
+        if torrent_info is None:
+            return []
+
+        files = torrent_info.files()
+        return [files.file_path(i) for i in range(files.num_files())]
+
+    def link_content(self, handle, user_id=None):
+        """Link downloaded files of a torrent into the directories of its users
+
+        Without a store_dir the torrent is downloaded to the directory of one
+        of its users, and the files are linked from there into the others.
+
+        Args:
+            handle (TorrentHandleWrapper): torrent
+            user_id (str, optional): only link for this user. Defaults to None.
+
+        Returns:
+            bool: True if every file is linked for every user
+        """
+
+        if self.store_dir:
+            complete = self.is_complete(handle.info_hash)
+        else:
+            complete = handle.handle.status(0).is_seeding
+
+        for user, save_dir in list(handle.save_dirs.items()):
+            if user_id is not None and user != user_id:
+                continue
+            if os.path.realpath(save_dir) == os.path.realpath(handle.save_dir):
+                continue
+
+            for path in self._files(handle):
+                try:
+                    self._link_file(
+                        os.path.join(handle.save_dir, path),
+                        os.path.join(save_dir, path),
+                        copy=complete,
+                        replace=complete,
+                    )
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        traceback.print_exc()
+                    elif handle.info_hash not in self.cross_device:
+                        self.cross_device.add(handle.info_hash)
+                        print(
+                            f"{handle.info_hash} is stored on another file system "
+                            f"than {save_dir}, its files are copied once complete"
+                        )
+
+        if complete:
+            self.cross_device.discard(handle.info_hash)
+        return complete
+
+    def adopt_content(self, info_hash, save_dir, torrent_info):
+        """Link files downloaded to a user's directory before the store was
+        used into the store, so they are not downloaded again
+
+        Args:
+            info_hash (str): info_hash
+            save_dir (str): user's download path
+            torrent_info (lt.torrent_info): metadata of the torrent
+
+        Returns:
+            bool: True if any file was linked into the store
+        """
+
+        if not self.store_dir or torrent_info is None or not os.path.isdir(save_dir):
+            return False
+
+        adopted = False
+        files = torrent_info.files()
+        for i in range(files.num_files()):
+            path = files.file_path(i)
+            try:
+                adopted |= self._link_file(
+                    os.path.join(save_dir, path),
+                    os.path.join(self._store_path(info_hash), path),
+                )
+            except OSError:
+                traceback.print_exc()
+        return adopted
+
+    def adopt_user_content(self, handle):
+        """Adopt files of every user of a torrent once its metadata is known,
+        torrents added from a magnet without cached metadata could not adopt
+        them when added. The torrent is checked again if any file was adopted.
+
+        Args:
+            handle (TorrentHandleWrapper): torrent
+        """
+
+        torrent_info = handle.handle.torrent_file()
+        adopted = False
+        for save_dir in list(handle.save_dirs.values()):
+            adopted |= self.adopt_content(handle.info_hash, save_dir, torrent_info)
+
+        if adopted:
+            handle.handle.force_recheck()
+
+    def on_torrent_finished(self, alert):
+        handle = self.handles.get(str(alert.handle.info_hash()).lower())
+        if handle is None:
+            return
+
+        if self.store_dir and handle.handle.status(0).is_seeding:
+            with open(self._complete_path(handle.info_hash), "w"):
+                pass
+        handle.links_complete = self.link_content(handle)
+
+    def collect_store_garbage(self):
+        """Remove torrents from the store which are not active, have no
+        subscribed user and are no longer linked from any user's directory"""
+        subscribed = set(self.subscribed()) if self.subscribed else set()
+        for info_hash in os.listdir(self.store_dir):
+            path = self._store_path(info_hash)
+            if info_hash.startswith(".") or info_hash in subscribed:
+                continue
+            if self._store_in_use(info_hash):
+                continue
+
+            linked = False
+            for root, dirs, files in os.walk(path):
+                if any(os.stat(os.path.join(root, f)).st_nlink > 1 for f in files):
+                    linked = True
+                    break
+            if linked:
+                continue
+
+            # Checked again, the torrent may have been added while walking
+            with self.lock:
+                if self._store_in_use(info_hash):
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                if os.path.exists(self._complete_path(info_hash)):
+                    os.remove(self._complete_path(info_hash))
+                self.discard_resume_data(info_hash)
+
+    def _store_in_use(self, info_hash):
+        with self.lock:
+            return info_hash in self.handles or info_hash in self.removing
+
+    def handle_store(self):
+        """Periodically link newly created files into users' directories and
+        collect unused content"""
+        if time.time() - self.linked_at >= self.link_interval:
+            self.linked_at = time.time()
+            for handle in list(self.handles.values()):
+                if not handle.links_complete:
+                    handle.links_complete = self.link_content(handle)
+
+        if not self.store_dir:
+            return
+
+        if time.time() - self.collected_at >= self.gc_interval:
+            self.collected_at = time.time()
+            try:
+                self.collect_store_garbage()
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+
+
+class PieceStreaming:
+    def __init__(self, readahead=8 * 1024 * 1024, deadline=1000):
+        self.stream_readahead = readahead
+        self.stream_deadline = deadline
+        self.piece_waiters = {}
+        self.stream_lock = threading.Lock()
+
+    def get_stream_file(self, info_hash, path):
+        """Get a file of a torrent which is still downloading
+
+        Args:
+            info_hash (str): info_hash
+            path (str): file path relative to the torrent's save_dir
+
+        Returns:
+            dict: file_index, file_size and path on disk, None if the torrent
+                is not in the session, has no metadata or is finished
+        """
+
+        handle = self.handles.get(info_hash)
+        if handle is None:
+            return None
+
+        status = handle.handle.status(0)
+        if not status.has_metadata or status.is_seeding:
+            return None
+
+        file_index = handle.file_index(path)
+        if file_index is None:
+            return None
+
+        files = handle.handle.torrent_file().files()
+        return {
+            "file_index": file_index,
+            "file_size": files.file_size(file_index),
+            "path": f"{handle.save_dir}/{files.file_path(file_index)}",
+        }
+
+    async def wait_for_range(self, info_hash, file_index, start, length, timeout=60):
+        """Prioritise the pieces of a byte range of a file and wait until they
+        are downloaded, pieces following the range are requested as readahead
+
+        Args:
+            info_hash (str): info_hash
+            file_index (int): file index in the torrent
+            start (int): first byte of the range in the file
+            length (int): length of the range
+            timeout (int, optional): max seconds to wait. Defaults to 60.
+
+        Returns:
+            int: bytes of the file available on disk from start, covering at
+                least the range, 0 if it did not arrive in time
+        """
+
+        handle = self.handles.get(info_hash)
+        if handle is None:
+            return 0
+
+        # Everything downloaded past the range is reported too, so callers
+        # only ask again once they reach a missing piece
+        file_size = handle.handle.torrent_file().files().file_size(file_index)
+
+        pieces = handle.piece_range(file_index, start, length)
+        readahead = handle.piece_range(
+            file_index, start + length, self.stream_readahead
+        )
+        missing = {piece for piece in pieces if not handle.handle.have_piece(piece)}
+        wanted = [piece for piece in pieces if piece in missing] + [
+            piece
+            for piece in readahead
+            if piece not in pieces and not handle.handle.have_piece(piece)
+        ]
+
+        # Earlier pieces get earlier deadlines, so playback order is kept
+        for i, piece in enumerate(wanted):
+            handle.handle.set_piece_deadline(piece, self.stream_deadline * (i + 1))
+
+        if not missing:
+            return handle.available_length(file_index, start, file_size - start)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = [missing, loop, future]
+
+        with self.stream_lock:
+            # Pieces may have finished before the waiter was registered
+            missing.difference_update(
+                [piece for piece in missing if handle.handle.have_piece(piece)]
+            )
+            if not missing:
+                return handle.available_length(file_index, start, file_size - start)
+            self.piece_waiters.setdefault(info_hash, []).append(waiter)
+
+        try:
+            await asyncio.wait_for(future, timeout)
+            return handle.available_length(file_index, start, file_size - start)
+        except asyncio.TimeoutError:
+            return 0
+        finally:
+            with self.stream_lock:
+                waiters = self.piece_waiters.get(info_hash, [])
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                if not waiters:
+                    self.piece_waiters.pop(info_hash, None)
+
+    def on_piece_finished(self, alert):
+        if not self.piece_waiters:
+            return
+
+        info_hash = str(alert.handle.info_hash()).lower()
+        with self.stream_lock:
+            for missing, loop, future in self.piece_waiters.get(info_hash, []):
+                missing.discard(alert.piece_index)
+                if not missing:
+                    loop.call_soon_threadsafe(_set_done, future)
+
+
+def _set_done(future):
+    if not future.done():
+        future.set_result(True)
@@ -0,0 +1,75 @@
+import asyncio
+import traceback
+
+PRESENCE_KEY = "socket:present:{}"
+
+
+def has_clients(redis, user_id):
+    """Check if a user has a socket.io client connected to any API worker,
+    for processes without a socket.io server
+
+    Args:
+        redis (Redis): synchronous redis client
+        user_id (str): user id
+
+    Returns:
+        bool: True if connected
+    """
+
+    return bool(redis.exists(PRESENCE_KEY.format(user_id)))
+
+
+class Presence:
+    """Counts socket.io sessions per user on this worker and marks users with
+    sessions as present in redis, so every process can skip work for users
+    nobody is watching
+
+    The presence key of a user expires after ttl seconds unless a worker with
+    a session of the user refreshes it, so sessions of a crashed worker are
+    not counted forever.
+    """
+
+    def __init__(self, redis, ttl=30):
+        self.redis = redis
+        self.ttl = ttl
+        self.sessions = {}
+
+    async def connect(self, user_id):
+        user_id = str(user_id)
+        self.sessions[user_id] = self.sessions.get(user_id, 0) + 1
+        await self.redis.set(PRESENCE_KEY.format(user_id), 1, ex=self.ttl)
+
+    def disconnect(self, user_id):
+        # The key is left to expire, other workers may have sessions too
+        user_id = str(user_id)
+        count = self.sessions.get(user_id, 0) - 1
+        if count > 0:
+            self.sessions[user_id] = count
+        else:
+            self.sessions.pop(user_id, None)
+
+    async def local(self, user_ids):
+        """Filter users with a session on this worker
+
+        Args:
+            user_ids (list): user ids
+
+        Returns:
+            set: user ids with sessions
+        """
+
+        return {str(user_id) for user_id in user_ids if str(user_id) in self.sessions}
+
+    async def run(self):
+        """Refresh presence keys of users with sessions on this worker, runs
+        on the app's event loop"""
+        while True:
+            try:
+                if self.sessions:
+                    pipe = self.redis.pipeline()
+                    for user_id in list(self.sessions):
+                        pipe.set(PRESENCE_KEY.format(user_id), 1, ex=self.ttl)
+                    await pipe.execute()
+            except Exception:
+                traceback.print_exc()
+            await asyncio.sleep(self.ttl / 3)
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import threading
+import time
+import traceback
+from shared.utils import get_disk_usage
+from shared.env import SOCKET_SNAPSHOT_INTERVAL
+
+SNAPSHOT_EVENT = "/stc/torrents-snapshot"
+SNAPSHOT_STREAM = "snapshots:stream"
+STREAM_MAXLEN = 10000
+
+
+def buffer_snapshot(redis, user_id, key, props):
+    """Buffer props of a download updated outside the API (celery tasks),
+    they go out with the user's next snapshot from every API worker
+
+    Args:
+        redis (Redis): synchronous redis client
+        user_id (str): user id
+        key (str): info_hash or url_hash of the download
+        props (dict): props of the download
+    """
+
+    redis.xadd(
+        SNAPSHOT_STREAM,
+        {"user_id": str(user_id), "key": key, "props": json.dumps(props)},
+        maxlen=STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+class SnapshotAggregator:
+    """Collects progress of all torrents of a user and emits it as a single
+    snapshot event per interval, instead of one event per torrent per update
+
+    A snapshot looks like {"torrents": [props, ...], "disk_usage": {...}},
+    props of a torrent only hold the fields which changed since the last
+    snapshot plus id_fields, and what was sent is forgotten every
+    resync_interval seconds so clients which connected later catch up. Disk
+    usage is computed once per user and at most every disk_usage_interval
+    seconds, it is left out of snapshots in between.
+
+    Every API worker aggregates all updates and emits snapshots to its own
+    clients only, so what was sent is known for each client.
+    """
+
+    def __init__(
+        self,
+        interval=1,
+        disk_usage_interval=5,
+        resync_interval=60,
+        id_fields=("info_hash", "url_hash"),
+    ):
+        self.interval = interval
+        self.disk_usage_interval = disk_usage_interval
+        self.resync_interval = resync_interval
+        self.id_fields = id_fields
+        self.pending = {}
+        self.sent = {}
+        self.sent_at = {}
+        self.disk_usage_at = {}
+        self.buffer_id = None
+        self.lock = threading.Lock()
+
+    def update(self, user_id, key, props):
+        """Buffer props of a torrent, callable from any thread
+
+        Args:
+            user_id (str): user id
+            key (str): info_hash or url_hash of the torrent
+            props (dict): props of the torrent
+        """
+
+        user_id = str(user_id)
+        with self.lock:
+            if time.time() - self.sent_at.get(user_id, 0) >= self.resync_interval:
+                self.sent_at[user_id] = time.time()
+                self.sent.pop(user_id, None)
+
+            sent = self.sent.setdefault(user_id, {}).get(key, {})
+            changes = {k: v for k, v in props.items() if sent.get(k) != v}
+            if changes:
+                changes.update({k: props[k] for k in self.id_fields if k in props})
+                self.pending.setdefault(user_id, {}).setdefault(key, {}).update(
+                    changes
+                )
+
+    def forget(self, user_id, key):
+        """Drop what was sent for a torrent, e.g. after it was removed
+
+        Args:
+            user_id (str): user id
+            key (str): info_hash or url_hash of the torrent
+        """
+
+        user_id = str(user_id)
+        with self.lock:
+            self.sent.get(user_id, {}).pop(key, None)
+            self.pending.get(user_id, {}).pop(key, None)
+
+    def drain(self):
+        """Take buffered changes, assuming they are emitted
+
+        Returns:
+            dict: changed props by key, by user id
+        """
+
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            for user_id, torrents in pending.items():
+                sent = self.sent.setdefault(user_id, {})
+                for key, changes in torrents.items():
+                    sent.setdefault(key, {}).update(changes)
+            return pending
+
+    def disk_usage_due(self, user_id):
+        if time.time() - self.disk_usage_at.get(user_id, 0) < self.disk_usage_interval:
+            return False
+        self.disk_usage_at[user_id] = time.time()
+        return True
+
+    def forget_user(self, user_id):
+        with self.lock:
+            self.sent.pop(user_id, None)
+            self.disk_usage_at.pop(user_id, None)
+
+    async def drain_buffer(self, redis, count=1000):
+        """Take props buffered by buffer_snapshot since the last drain, every
+        worker reads the whole stream
+
+        Args:
+            redis (redis.asyncio.Redis): asyncio redis client
+            count (int, optional): entries read at once. Defaults to 1000.
+        """
+
+        if self.buffer_id is None:
+            last = await redis.xrevrange(SNAPSHOT_STREAM, count=1)
+            self.buffer_id = last[0][0] if last else "0-0"
+
+        while True:
+            entries = await redis.xread({SNAPSHOT_STREAM: self.buffer_id}, count=count)
+            messages = entries[0][1] if entries else []
+            for message_id, fields in messages:
+                self.buffer_id = message_id
+                self.update(
+                    fields[b"user_id"].decode(),
+                    fields[b"key"].decode(),
+                    json.loads(fields[b"props"]),
+                )
+            if len(messages) < count:
+                break
+
+    async def run(self, emit, online, redis=None):
+        """Emit snapshots every interval, runs on the app's event loop
+
+        Snapshots of users without clients on this worker are dropped before
+        disk usage is computed, they get full props once they are back.
+
+        Args:
+            emit (function): emit(event_name, data, user_id) to this worker's
+                clients
+            online (coroutine function): filters user ids with clients on
+                this worker
+            redis (redis.asyncio.Redis, optional): client to drain props
+                buffered by other processes. Defaults to None.
+        """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if redis is not None:
+                    await self.drain_buffer(redis)
+                pending = self.drain()
+                connected = await online(list(pending)) if pending else set()
+                for user_id, torrents in pending.items():
+                    if user_id not in connected:
+                        self.forget_user(user_id)
+                        continue
+
+                    snapshot = {"torrents": list(torrents.values())}
+                    if self.disk_usage_due(user_id):
+                        snapshot["disk_usage"] = await loop.run_in_executor(
+                            None, get_disk_usage, user_id
+                        )
+                    emit(SNAPSHOT_EVENT, snapshot, user_id)
+            except Exception:
+                traceback.print_exc()
+            await asyncio.sleep(self.interval)
+
+
+snapshots = SnapshotAggregator(interval=SOCKET_SNAPSHOT_INTERVAL)
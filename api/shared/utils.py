@@ -1,6 +1,9 @@
 import os
 import logging
 import typing
+import shutil
+import traceback
+from pathlib import Path
 
 
 class EndpointFilter(logging.Filter):
@@ -15,3 +18,21 @@ class EndpointFilter(logging.Filter):
 
     def filter(self, record: logging.LogRecord) -> bool:
         return record.getMessage().find(self._path) == -1
+
+
+def get_disk_usage(user_id):
+    try:
+        total = shutil.disk_usage("/downloads").total
+        occupied_by_user = 0
+        if os.path.exists(f"/downloads/{user_id}"):
+            occupied_by_user = sum(
+                f.stat().st_blocks * 512
+                for f in Path(f"/downloads/{user_id}").rglob("*")
+                if f.is_file()
+            )
+        occupied_by_others = shutil.disk_usage("/downloads").used - occupied_by_user
+
+        return {"used": occupied_by_user, "total": total - occupied_by_others}
+    except Exception as e:
+        traceback.print_exc()
+        return {"used": 0, "total": 0}
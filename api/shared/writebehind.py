@@ -0,0 +1,208 @@
+import threading
+import time
+from pymongo import UpdateOne
+
+
+class WriteBehind:
+    """Buffers $set updates of documents and keeps only the fields which
+    changed since they were last written, so frequent progress updates turn
+    into a few small bulk writes. Changes being written count as written, so
+    a field reverted while its change is in flight is written again.
+
+    Updates touching a state field (finished, paused) are due immediately,
+    others once flush_interval seconds passed since the last flush. What was
+    persisted is forgotten after resync_interval, so documents written by
+    other processes are fully rewritten now and then.
+    """
+
+    def __init__(
+        self,
+        flush_interval=5,
+        resync_interval=60,
+        state_fields=("is_finished", "is_paused"),
+    ):
+        self.flush_interval = flush_interval
+        self.resync_interval = resync_interval
+        self.state_fields = state_fields
+        self.filters = {}
+        self.persisted = {}
+        self.persisted_at = {}
+        self.pending = {}
+        self.in_flight = {}
+        self.urgent = False
+        self.flushed_at = time.time()
+        self.lock = threading.Lock()
+
+    def update(self, filter, fields):
+        """Buffer fields to $set on the document matching filter
+
+        Args:
+            filter (dict): filter of a single document
+            fields (dict): fields to set
+
+        Returns:
+            bool: True if a flush is due
+        """
+
+        key = tuple(sorted(filter.items()))
+        with self.lock:
+            if time.time() - self.persisted_at.get(key, 0) >= self.resync_interval:
+                self.persisted.pop(key, None)
+
+            persisted = {**self.persisted.get(key, {}), **self.in_flight.get(key, {})}
+            changes = {
+                k: v
+                for k, v in fields.items()
+                if k not in persisted or persisted[k] != v
+            }
+            if changes:
+                self.filters[key] = filter
+                self.pending.setdefault(key, {}).update(changes)
+                if any(k in changes for k in self.state_fields):
+                    self.urgent = True
+
+        return self.due()
+
+    def due(self):
+        return bool(self.pending) and (
+            self.urgent or time.time() - self.flushed_at >= self.flush_interval
+        )
+
+    def drain(self):
+        """Take buffered changes to write
+
+        Returns:
+            dict: filter and changes by document, to pass to commit once
+                written or to requeue if the write failed
+        """
+
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            for key, changes in pending.items():
+                self.in_flight.setdefault(key, {}).update(changes)
+            self.urgent = False
+            self.flushed_at = time.time()
+            return {
+                key: (self.filters[key], changes) for key, changes in pending.items()
+            }
+
+    def commit(self, batch):
+        """Remember changes of a drained batch as persisted
+
+        Args:
+            batch (dict): batch returned by drain
+        """
+
+        with self.lock:
+            for key, (filter, changes) in batch.items():
+                self.in_flight.pop(key, None)
+                if key not in self.persisted:
+                    self.persisted_at[key] = time.time()
+                self.persisted.setdefault(key, {}).update(changes)
+
+    def requeue(self, batch):
+        """Buffer changes of a batch which failed to write again, changes
+        buffered since the batch was drained are newer and win
+
+        Args:
+            batch (dict): batch returned by drain
+        """
+
+        with self.lock:
+            for key, (filter, changes) in batch.items():
+                self.in_flight.pop(key, None)
+                self.filters.setdefault(key, filter)
+                self.pending[key] = {**changes, **self.pending.get(key, {})}
+                if any(k in changes for k in self.state_fields):
+                    self.urgent = True
+
+    def _operations(self, batch, stamps=None):
+        operations = []
+        for i, (filter, changes) in enumerate(batch.values()):
+            if stamps is not None:
+                changes = {**changes, **stamps[i]}
+            operations.append(UpdateOne(filter, {"$set": changes}))
+        return operations
+
+    def forget(self, filter):
+        """Drop what was persisted for a document, e.g. after it was deleted
+        or written elsewhere
+
+        Args:
+            filter (dict): filter of the document
+        """
+
+        key = tuple(sorted(filter.items()))
+        with self.lock:
+            self.persisted.pop(key, None)
+            self.persisted_at.pop(key, None)
+            self.pending.pop(key, None)
+            self.in_flight.pop(key, None)
+            self.filters.pop(key, None)
+
+    def reset(self):
+        """Drop what was persisted for every document, e.g. after other
+        processes wrote them, buffered changes are kept"""
+        with self.lock:
+            self.persisted.clear()
+            self.persisted_at.clear()
+
+    def flush(self, collection, stamp=None, unstamp=None):
+        """Write buffered changes with a synchronous (pymongo) collection,
+        changes are buffered again if the write fails
+
+        Args:
+            collection (pymongo.collection.Collection): collection
+            stamp (function, optional): called outside the lock with the
+                filters of the drained documents, returns extra fields to set
+                on each which are not buffered (e.g. a version). Defaults to None.
+            unstamp (function, optional): called with the filters and the
+                fields returned by stamp once the write finished or failed.
+                Defaults to None.
+        """
+
+        batch = self.drain()
+        if not batch:
+            return
+
+        filters = [filter for filter, changes in batch.values()]
+        stamps = None
+        try:
+            if stamp is not None:
+                stamps = stamp(filters)
+            collection.bulk_write(self._operations(batch, stamps), ordered=False)
+        except Exception:
+            self.requeue(batch)
+            raise
+        finally:
+            if unstamp is not None and stamps is not None:
+                unstamp(filters, stamps)
+        self.commit(batch)
+
+    async def flush_async(self, collection, stamp=None, unstamp=None):
+        """Write buffered changes with a motor collection, changes are
+        buffered again if the write fails
+
+        Args:
+            collection (motor.motor_asyncio.AsyncIOMotorCollection): collection
+            stamp (coroutine function, optional): see flush. Defaults to None.
+            unstamp (coroutine function, optional): see flush. Defaults to None.
+        """
+
+        batch = self.drain()
+        if not batch:
+            return
+
+        filters = [filter for filter, changes in batch.values()]
+        stamps = None
+        try:
+            if stamp is not None:
+                stamps = await stamp(filters)
+            await collection.bulk_write(self._operations(batch, stamps), ordered=False)
+        except Exception:
+            self.requeue(batch)
+            raise
+        finally:
+            if unstamp is not None and stamps is not None:
+                await unstamp(filters, stamps)
+        self.commit(batch)
@@ -3,11 +3,15 @@ import os
 import time
 import celery_worker
 import subprocess as sp
-import json
 from redis import Redis
 from bson import ObjectId
 from pymongo import MongoClient
+from shared.writebehind import WriteBehind
+from shared.changes import ChangeLog
+from shared.emitter import emit_external
+from shared.snapshots import buffer_snapshot
 import signal
+import threading
 
 REDIS_HOST = os.environ.get("REDIS_HOST", None)
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
@@ -64,21 +68,45 @@ def download_from_url(url, url_hash, save_dir, user_id):
         preexec_fn=os.setsid,
     )
 
-    key = f"{user_id}/{url_hash}/stop"
-    redis.delete(key)
+    # Pause and delete publish "stop" on the control channel of the download
+    stopped = threading.Event()
+
+    def on_control(message):
+        if message["data"] != b"stop":
+            return
+
+        stopped.set()
+        try:
+            os.killpg(os.getpgid(cp.pid), signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{f"control:{user_id}/{url_hash}": on_control})
+    listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    # Paused before the task subscribed
+    torrent = db.torrents.find_one(
+        {"url_hash": url_hash, "user_id": ObjectId(user_id)}, {"is_paused": True}
+    )
+    if torrent and torrent.get("is_paused"):
+        on_control({"data": b"stop"})
+
+    # Progress is written as diffs every few seconds instead of every line
+    writes = WriteBehind()
+    changes = ChangeLog(redis)
+    torrent_filter = {"url_hash": url_hash, "user_id": ObjectId(user_id)}
 
     while True:
         line = cp.stdout.readline()
-        if not line or redis.get(key):
+        if not line or stopped.is_set():
+            writes.flush(db.torrents, stamp=changes.stamp, unstamp=changes.unstamp)
+            version = changes.record(user_id, url_hash)
             db.torrents.update_one(
                 {"url_hash": url_hash, "user_id": ObjectId(user_id)},
-                {
-                    "$set": {
-                        "is_paused": True,
-                        "download_speed": 0,
-                    }
-                },
+                {"$set": {"is_paused": True, "download_speed": 0, "version": version}},
             )
+            changes.release(user_id, version)
             break
 
         # print(line, end="")
@@ -110,35 +138,27 @@ def download_from_url(url, url_hash, save_dir, user_id):
                 "is_finished": False,
             }
 
-            db.torrents.update_one(
-                {"url_hash": url_hash, "user_id": ObjectId(user_id)}, {"$set": props}
-            )
-            props["url_hash"] = url_hash
-            payload = json.dumps(
-                {
-                    "action": "emit",
-                    "user_id": user_id,
-                    "progress": info.get("progress"),
-                    "eta": info.get("eta"),
-                    "url_hash": url_hash,
-                    "props": props,
-                }
-            )
-            redis.publish("events", payload)
-
-    if redis.get(key):
-        redis.delete(key)
-        if cp.poll() is None:
-            try:
-                os.killpg(os.getpgid(cp.pid), signal.SIGKILL)
-            except ProcessLookupError:
-                pass
+            if writes.update(torrent_filter, props):
+                writes.flush(db.torrents, stamp=changes.stamp, unstamp=changes.unstamp)
+
+            # Sent with the user's next snapshot by the API
+            buffer_snapshot(redis, user_id, url_hash, {**props, "url_hash": url_hash})
+
+    listener.stop()
+    pubsub.close()
+
+    if stopped.is_set():
+        cp.wait()
+        # Let the stopping request know aria2 is gone
+        ack_key = f"control:{user_id}/{url_hash}/stopped"
+        redis.rpush(ack_key, 1)
+        redis.expire(ack_key, 60)
         return {"message": "terminated"}
     else:
-        redis.delete(key)
         cp.stdout.close()
         cp.wait()
 
+        version = changes.record(user_id, url_hash)
         db.torrents.update_one(
             {"url_hash": url_hash, "user_id": ObjectId(user_id)},
             {
@@ -146,25 +166,28 @@ def download_from_url(url, url_hash, save_dir, user_id):
                     "is_paused": True,
                     "is_finished": True,
                     "download_speed": 0,
+                    "version": version,
                 }
             },
         )
-        payload = json.dumps(
+        changes.release(user_id, version)
+        buffer_snapshot(
+            redis,
+            user_id,
+            url_hash,
             {
-                "action": "emit",
-                "user_id": user_id,
+                "download_speed": 0,
                 "progress": 100,
-                "eta": 0,
+                "is_paused": True,
+                "is_finished": True,
                 "url_hash": url_hash,
-                "props": {
-                    "download_speed": 0,
-                    "progress": 100,
-                    "is_paused": True,
-                    "is_finished": True,
-                },
-            }
+            },
+        )
+        emit_external(
+            "/stc/torrent-added-or-removed",
+            {"action": "finished", "url_hash": url_hash},
+            user_id,
         )
-        redis.publish("events", payload)
 
         if os.path.exists(save_dir):
             return {"message": "success"}
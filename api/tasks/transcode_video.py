@@ -4,6 +4,9 @@ import celery_worker
 import subprocess as sp
 from shared.factory import redis
 import json
+import time
+from shared.emitter import emit_external
+from shared.presence import has_clients
 
 PRESETS = {
     "144p": "--width 256 --height 144 -e x264 --encopts preset=medium -q 27 --auto-anamorphic -f mp4 --all-audio --aencoder av_aac --ab 128 --mixdown stereo --all-subtitles --subtitle-lang-list all --subtitle-default=none",
@@ -38,6 +41,7 @@ def transcode_video(input_path, output_path, resolution, user_id):
     )
 
     key = f"transcoding_progress/{output_path}"
+    emitted_at = 0
 
     while True:
         line = cp.stdout.readline()
@@ -52,10 +56,13 @@ def transcode_video(input_path, output_path, resolution, user_id):
             progress = float(progress_match.group(1))  # 1-100
             eta = convert_to_seconds(eta_match.group(1))
             file_size = os.path.getsize(output_path)
-            redis.set(
-                key,
-                json.dumps({"progress": progress, "eta": eta, "file_size": file_size}),
-            )
+            data = {"progress": progress, "eta": eta, "file_size": file_size}
+            redis.set(key, json.dumps(data))
+
+            # HandBrake reports many times a second, clients get one update
+            if time.time() - emitted_at >= 1 and has_clients(redis, user_id):
+                emitted_at = time.time()
+                emit_external(f"/stc/{key}", data, user_id)
             # print(f"\nProgress: {progress}% | ETA: {eta / 60:.2f} min")
 
     if redis.get(f"{key}/kill"):
@@ -4,6 +4,7 @@ import React, {
   useContext,
   useMemo,
   useCallback,
+  useRef,
 } from "react";
 import axios from "axios";
 import apiRoutes from "@/shared/routes/apiRoutes";
@@ -42,6 +43,11 @@ export default function TorrentList({ state, onPathChange }) {
     return Array.isArray(cachedList) ? cachedList.length : 0;
   });
   const [pageInput, setPageInput] = useState("1");
+  // Change version of the loaded list, changes after it are synced on reconnect
+  const versionRef = useRef(null);
+  const loadVersionRef = useRef(null);
+  const loadedAtRef = useRef(null);
+  const torrentListRef = useRef(torrentList);
 
   const totalPages = useMemo(
     () => Math.max(1, Math.ceil((totalTorrents || 0) / pageSize)),
@@ -76,6 +82,11 @@ export default function TorrentList({ state, onPathChange }) {
       });
 
       setTotalTorrents(total);
+      if (typeof meta.version === "number") {
+        versionRef.current = meta.version;
+        loadVersionRef.current = meta.version;
+        loadedAtRef.current = meta.loaded_at ? new Date(meta.loaded_at) : null;
+      }
 
       if (currentPage > computedPages) {
         setCurrentPage(computedPages);
@@ -140,6 +151,7 @@ export default function TorrentList({ state, onPathChange }) {
   }, [state, pageSize]);
 
   useEffect(() => {
+    torrentListRef.current = torrentList;
     state?.set({
       torrentListCache: torrentList,
       torrentListTotal: totalTorrents,
@@ -182,30 +194,95 @@ export default function TorrentList({ state, onPathChange }) {
   }, [state.get("hoveredTorrentInfoHash"), torrentList]);
 
   useEffect(() => {
-    torrentList.forEach((torrent) => {
-      socket.on(
-        socketRoutes.stcTorrentPropsUpdate +
-          `/${torrent?.info_hash || torrent?.url_hash}`,
+    // Fetch only torrents changed while disconnected
+    const handleReconnect = () => {
+      if (versionRef.current === null) {
+        return;
+      }
+
+      socket.emit(
+        socketRoutes.ctsTorrentChanges,
+        { since: versionRef.current },
         (data) => {
-          if (data?.info_hash || data?.url_hash) {
-            setTorrentList((prevTorrentList) =>
-              prevTorrentList.map((t) =>
-                t.info_hash === data?.info_hash ? { ...t, ...data } : t
-              )
+          if (!data || data.reset) {
+            fetchTorrents();
+            return;
+          }
+
+          const changed = new Map();
+          (data.torrents || []).forEach((torrent) => {
+            changed.set(torrent.info_hash || torrent.url_hash, torrent);
+          });
+          const removed = new Set(data.removed || []);
+          const keys = new Set(
+            torrentListRef.current.map((t) => t.info_hash || t.url_hash)
+          );
+          // Torrents off this page which existed at load time belong to
+          // other pages, only new ones can shift this page
+          const isNew = (torrent) =>
+            torrent.version > loadVersionRef.current &&
+            !(
+              torrent.created_at &&
+              loadedAtRef.current &&
+              new Date(torrent.created_at) < loadedAtRef.current
             );
+          const missing =
+            [...removed].some((key) => keys.has(key)) ||
+            [...changed].some(
+              ([key, torrent]) => !keys.has(key) && isNew(torrent)
+            );
+
+          setTorrentList((prevTorrentList) =>
+            prevTorrentList.map((t) => {
+              const torrent = changed.get(t.info_hash || t.url_hash);
+              return torrent ? { ...t, ...torrent } : t;
+            })
+          );
+          if (typeof data.version === "number") {
+            versionRef.current = data.version;
+          }
+
+          // Added or removed torrents shift the pages
+          if (missing) {
+            fetchTorrents();
           }
         }
       );
-    });
+    };
+    socket.on("connect", handleReconnect);
 
     return () => {
-      torrentList.forEach((torrent) => {
-        socket.off(
-          socketRoutes.stcTorrentPropsUpdate + `/${torrent.info_hash}`
-        );
+      socket.off("connect", handleReconnect);
+    };
+  }, [socket, fetchTorrents]);
+
+  useEffect(() => {
+    // One snapshot per second holds the changed props of all torrents
+    const handleSnapshot = (data) => {
+      const updates = new Map();
+      (data?.torrents || []).forEach((props) => {
+        const key = props?.info_hash || props?.url_hash;
+        if (key) {
+          updates.set(key, { ...updates.get(key), ...props });
+        }
       });
+      if (updates.size === 0) {
+        return;
+      }
+
+      setTorrentList((prevTorrentList) =>
+        prevTorrentList.map((t) => {
+          const props = updates.get(t.info_hash || t.url_hash);
+          return props ? { ...t, ...props } : t;
+        })
+      );
+    };
+    socket.on(socketRoutes.stcTorrentsSnapshot, handleSnapshot);
+
+    return () => {
+      socket.off(socketRoutes.stcTorrentsSnapshot, handleSnapshot);
     };
-  }, [torrentList?.length]);
+  }, [socket]);
 
   const shouldShowPagination = torrentList.length > 0;
 
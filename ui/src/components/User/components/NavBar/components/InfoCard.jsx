@@ -30,8 +30,17 @@ export default function InfoCard() {
       }
     });
 
+    // Torrent snapshots carry disk usage every few seconds
+    const handleSnapshot = (data) => {
+      if (data?.disk_usage) {
+        setDiskStatus(data.disk_usage);
+      }
+    };
+    socket.on(socketRoutes.stcTorrentsSnapshot, handleSnapshot);
+
     return () => {
       socket.off(socketRoutes.stcDiskUsage);
+      socket.off(socketRoutes.stcTorrentsSnapshot, handleSnapshot);
     };
   }, []);
 
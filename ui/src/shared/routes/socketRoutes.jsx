@@ -1,10 +1,13 @@
 let socketRoutes = {
   // torrent props update
   stcTorrentPropsUpdate: "/stc/torrent-props-update",
+  stcTorrentsSnapshot: "/stc/torrents-snapshot",
   stcTorrentAddedOrRemoved: "/stc/torrent-added-or-removed",
   stcDiskUsage: "/stc/disk-usage",
   stcTranscodingProgress: "/stc/transcoding_progress",
   stcDownloadStatus: "/stc/download_status",
+  // client to server
+  ctsTorrentChanges: "/cts/torrent-changes",
 };
 
 export default socketRoutes;